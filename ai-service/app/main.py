@@ -3,7 +3,7 @@ Main FastAPI Application for AI Service
 """
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
 from loguru import logger
@@ -20,12 +20,17 @@ import sentry_sdk
 from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
 from prometheus_client import Counter, Histogram, generate_latest
 from prometheus_client.core import CollectorRegistry
+import os
 import time
+import torch
 
 from config.settings import settings
 from app.routers import models, health, chat, analysis, metrics
 from services.model_manager import ModelManager
-from utils.middleware import TimingMiddleware, AuthMiddleware
+from services.context_manager import get_context_manager
+from models.gpt4_medical import close_openai_http_client
+from utils.middleware import TimingMiddleware, AuthMiddleware, RateLimitMiddleware
+from utils.tracing import initialize_tracing, instrument_app, shutdown_tracing
 
 
 # Metrics
@@ -48,6 +53,9 @@ async def lifespan(app: FastAPI):
     # Initialize comprehensive logging
     initialize_logging()
     
+    # Initialize distributed tracing (not done at import time)
+    initialize_tracing()
+    
     # Startup
     with LogContext(trace_id=generate_trace_id()):
         logger.info("Starting AI Service...", extra={
@@ -60,11 +68,18 @@ async def lifespan(app: FastAPI):
             sentry_sdk.init(dsn=settings.sentry_dsn)
             logger.info("Sentry monitoring initialized")
         
+        # Intra-op threads are process-wide, shared by every torch model
+        torch.set_num_threads(min(settings.torch_num_threads, os.cpu_count() or 1))
+        
         # Initialize model manager
         model_manager = ModelManager()
         await model_manager.initialize()
         app.state.model_manager = model_manager
         
+        # Share the context manager's Redis pool with the rate limiter
+        context_manager = await get_context_manager()
+        app.state.redis_client = context_manager.redis_client
+        
         log_business_event("service_started", {
             "service": "ai-service",
             "version": "1.0.0",
@@ -83,6 +98,9 @@ async def lifespan(app: FastAPI):
         })
         
         await model_manager.shutdown()
+        await context_manager.shutdown()
+        await close_openai_http_client()
+        shutdown_tracing()
         
         log_business_event("service_stopped", {
             "service": "ai-service",
@@ -97,7 +115,8 @@ app = FastAPI(
     title="AUSTA AI Service",
     description="AI Service for Medical Audit Decision Support",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -111,8 +130,14 @@ app.add_middleware(
 
 # Add custom middleware
 app.add_middleware(TimingMiddleware)
+if settings.rate_limit_per_minute:
+    # Added before AuthMiddleware so it runs after it and can key on the caller
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=settings.rate_limit_per_minute)
 app.add_middleware(AuthMiddleware)
 
+# Trace requests; spans record once initialize_tracing() runs in lifespan
+instrument_app(app)
+
 # Add Sentry middleware
 if settings.sentry_dsn:
     app.add_middleware(SentryAsgiMiddleware)
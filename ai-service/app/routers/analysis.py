@@ -5,15 +5,19 @@ from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import asyncio
 import uuid
+from loguru import logger
 
 from models import ModelInput
 from services.model_manager import get_model_manager
 from services.context_manager import get_context_manager
-from utils.validators import validate_case_data
+from utils.validators import validate_case_data, validate_case_data_batch
+from utils.json_routing import ORJSONRoute
+from config.settings import settings
 
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 
 class CaseAnalysisRequest(BaseModel):
@@ -179,6 +183,16 @@ async def batch_analysis(
     if len(cases) > 100:
         raise HTTPException(status_code=400, detail="Maximum 100 cases per batch")
     
+    # Validate all cases together, reporting errors by case ID
+    validation_results = validate_case_data_batch([case.dict() for case in cases])
+    validation_errors = {
+        case.case_id: errors
+        for case, errors in zip(cases, validation_results)
+        if errors
+    }
+    if validation_errors:
+        raise HTTPException(status_code=400, detail=validation_errors)
+    
     # Queue batch analysis
     batch_id = str(uuid.uuid4())
     background_tasks.add_task(
@@ -203,7 +217,34 @@ async def process_batch_analysis(
 ):
     """
     Process batch analysis in the background.
+    
+    Cases are dispatched concurrently, bounded by BATCH_MAX_CONCURRENCY so
+    the pipeline's upstream LLM calls stay within rate limits.
     """
-    # Implementation would process cases and store results
-    # This is a placeholder for the actual implementation
-    pass
\ No newline at end of file
+    pipeline = model_manager.get_model("decision_pipeline")
+    if not pipeline:
+        logger.error(f"Batch {batch_id} aborted: decision pipeline not available")
+        return
+    
+    context_manager = await get_context_manager()
+    semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+    
+    async def analyze(case: CaseAnalysisRequest):
+        async with semaphore:
+            result = await pipeline.predict(
+                ModelInput(case_id=case.case_id, data=case.dict(exclude={"case_id"}))
+            )
+        
+        await context_manager.store_analysis_context(case.case_id, case.dict(), result.prediction)
+        return result
+    
+    # gather preserves input order, so results line up with cases
+    results = await asyncio.gather(*(analyze(case) for case in cases), return_exceptions=True)
+    
+    failed = 0
+    for case, result in zip(cases, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Batch {batch_id}: analysis failed for case {case.case_id}: {result}")
+    
+    logger.info(f"Batch {batch_id} completed: {len(cases) - failed}/{len(cases)} cases analyzed")
\ No newline at end of file
@@ -10,9 +10,10 @@ import json
 from services.model_manager import get_model_manager
 from services.context_manager import get_context_manager
 from services.chat_service import ChatService
+from utils.json_routing import ORJSONRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 
 class ChatRequest(BaseModel):
@@ -0,0 +1,42 @@
+"""
+Bake ai_models.yaml into an importable Python module
+
+Usage: python -m config.bake_model_configs
+"""
+import hashlib
+import os
+import pprint
+
+import yaml
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(CONFIG_DIR, "ai_models.yaml")
+BAKED_PATH = os.path.join(CONFIG_DIR, "ai_models_baked.py")
+
+
+def bake(source_path: str = SOURCE_PATH, baked_path: str = BAKED_PATH) -> str:
+    """Write the YAML model configs as a Python dict literal module."""
+    with open(source_path, "rb") as f:
+        raw = f.read()
+
+    config = yaml.safe_load(raw) or {}
+
+    content = (
+        '"""\n'
+        "Model configurations baked from ai_models.yaml.\n"
+        "Generated by config/bake_model_configs.py, do not edit.\n"
+        '"""\n'
+        f"SOURCE_DIGEST = {hashlib.sha256(raw).hexdigest()!r}\n\n"
+        f"MODELS = {pprint.pformat(config.get('models', {}), sort_dicts=False)}\n"
+    )
+
+    tmp_path = f"{baked_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, baked_path)
+
+    return baked_path
+
+
+if __name__ == "__main__":
+    print(f"Baked model configs to {bake()}")
@@ -17,6 +17,7 @@ class Settings(BaseSettings):
     # Database
     database_url: str = Field(env="DATABASE_URL")
     redis_url: str = Field(env="REDIS_URL")
+    redis_max_connections: int = Field(default=64, env="REDIS_MAX_CONNECTIONS")
     
     # OpenAI Configuration
     openai_api_key: str = Field(env="OPENAI_API_KEY")
@@ -34,10 +35,15 @@ class Settings(BaseSettings):
     bert_confidence_threshold: float = Field(default=0.85, env="BERT_CONFIDENCE_THRESHOLD")
     fraud_detection_threshold: float = Field(default=0.7, env="FRAUD_DETECTION_THRESHOLD")
     pattern_analysis_window: int = Field(default=30, env="PATTERN_ANALYSIS_WINDOW")
+    batch_max_concurrency: int = Field(default=8, env="BATCH_MAX_CONCURRENCY")
+    # Process-wide torch intra-op threads, capped at the CPU count at startup
+    torch_num_threads: int = Field(default=4, env="TORCH_NUM_THREADS")
     
     # Security
     jwt_secret_key: str = Field(env="JWT_SECRET_KEY")
     encryption_key: str = Field(env="ENCRYPTION_KEY")
+    # Per-client request budget; rate limiting is off unless this is set
+    rate_limit_per_minute: Optional[int] = Field(default=None, env="RATE_LIMIT_PER_MINUTE")
     
     # Monitoring
     sentry_dsn: Optional[str] = Field(default=None, env="SENTRY_DSN")
@@ -53,6 +53,10 @@ class BaseAIModel(ABC):
         """Validate input data."""
         pass
     
+    async def unload(self) -> None:
+        """Release model resources. Subclasses drop their heavy references."""
+        self.is_loaded = False
+    
     async def preprocess(self, input_data: ModelInput) -> Any:
         """Preprocess input data."""
         return input_data
@@ -86,6 +90,12 @@ class EnsembleModel(BaseAIModel):
             await model.load_model()
         self.is_loaded = True
     
+    async def unload(self) -> None:
+        """Unload all constituent models."""
+        for model in self.models:
+            await model.unload()
+        await super().unload()
+    
     async def predict(self, input_data: ModelInput) -> ModelPrediction:
         """Ensemble prediction combining all models."""
         predictions = []
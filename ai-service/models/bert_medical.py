@@ -1,6 +1,7 @@
 """
 BERT Medical Model for Portuguese Medical Text Analysis
 """
+import asyncio
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification, AutoModelForTokenClassification
 from typing import Any, Dict, List, Optional, Tuple
@@ -28,24 +29,8 @@ class BERTMedicalModel(BaseAIModel):
         try:
             logger.info(f"Loading BERT Medical model: {self.model_id}")
             
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
-            
-            # Load classification model for medical text
-            self.classification_model = AutoModelForSequenceClassification.from_pretrained(
-                self.model_id,
-                num_labels=10  # Adjust based on your classification needs
-            ).to(self.device)
-            
-            # Load NER model for entity recognition
-            self.ner_model = AutoModelForTokenClassification.from_pretrained(
-                self.model_id,
-                num_labels=15  # Medical entities: DISEASE, SYMPTOM, MEDICATION, etc.
-            ).to(self.device)
-            
-            # Set models to evaluation mode
-            self.classification_model.eval()
-            self.ner_model.eval()
+            # from_pretrained is blocking disk/CPU work; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._load_weights)
             
             self.is_loaded = True
             logger.info("BERT Medical model loaded successfully")
@@ -54,6 +39,34 @@ class BERTMedicalModel(BaseAIModel):
             logger.error(f"Failed to load BERT Medical model: {e}")
             raise
     
+    def _load_weights(self) -> None:
+        """Load tokenizer and models synchronously."""
+        # Load tokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        
+        # Load classification model for medical text
+        self.classification_model = AutoModelForSequenceClassification.from_pretrained(
+            self.model_id,
+            num_labels=10  # Adjust based on your classification needs
+        ).to(self.device)
+        
+        # Load NER model for entity recognition
+        self.ner_model = AutoModelForTokenClassification.from_pretrained(
+            self.model_id,
+            num_labels=15  # Medical entities: DISEASE, SYMPTOM, MEDICATION, etc.
+        ).to(self.device)
+        
+        # Set models to evaluation mode
+        self.classification_model.eval()
+        self.ner_model.eval()
+    
+    async def unload(self) -> None:
+        """Release BERT models and tokenizer."""
+        self.tokenizer = None
+        self.classification_model = None
+        self.ner_model = None
+        await super().unload()
+    
     async def predict(self, input_data: ModelInput) -> ModelPrediction:
         """Analyze medical text and extract insights."""
         start_time = time.time()
@@ -2,13 +2,39 @@
 GPT-4 Medical Chat Interface for Medical Audit Assistance
 """
 import openai
+import httpx
 from typing import Any, Dict, List, Optional, Tuple
+import functools
+import hashlib
 import time
 import json
+import orjson
+from cachetools import TTLCache
 from loguru import logger
 
 from .base import BaseAIModel, ModelInput, ModelPrediction
 from config.settings import settings
+from utils.logging_config import log_performance_metric
+
+
+# Response cache lookups between hit-ratio metric reports
+_CACHE_METRIC_INTERVAL = 100
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai_http_client() -> httpx.AsyncClient:
+    """Process-wide HTTP client so every OpenAI client shares one keep-alive pool."""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100)
+    )
+
+
+async def close_openai_http_client() -> None:
+    """Close the shared OpenAI HTTP client, if it was ever created."""
+    if get_openai_http_client.cache_info().currsize:
+        await get_openai_http_client().aclose()
+        get_openai_http_client.cache_clear()
 
 
 class GPT4MedicalModel(BaseAIModel):
@@ -23,18 +49,34 @@ class GPT4MedicalModel(BaseAIModel):
         self.system_prompt = config.get("system_prompt", "")
         self.client = None
         self.context_history = {}  # Store conversation contexts
+        # Parsed responses keyed by a digest of the case content, so
+        # identical cases submitted under different IDs skip the LLM call
+        self._response_cache = TTLCache(
+            maxsize=config.get("response_cache_size", 1024),
+            ttl=config.get("response_cache_ttl", 3600)
+        )
+        self._cache_hits = 0
+        self._cache_misses = 0
     
     async def load_model(self) -> None:
         """Initialize OpenAI client."""
         try:
             logger.info(f"Initializing GPT-4 Medical client: {self.model_id}")
-            self.client = openai.AsyncOpenAI(api_key=self.api_key)
+            self.client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=get_openai_http_client()
+            )
             self.is_loaded = True
             logger.info("GPT-4 Medical client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize GPT-4 Medical client: {e}")
             raise
     
+    async def unload(self) -> None:
+        """Drop the OpenAI client; the shared connection pool stays open for reloads."""
+        self.client = None
+        await super().unload()
+    
     async def predict(self, input_data: ModelInput) -> ModelPrediction:
         """Generate medical audit analysis using GPT-4."""
         start_time = time.time()
@@ -45,18 +87,37 @@ class GPT4MedicalModel(BaseAIModel):
         # Build context-aware prompt
         messages = self._build_messages(case_data, input_data.case_id)
         
+        # Prompts carrying earlier turns for this case are never served from cache
+        cache_key = None if input_data.case_id in self.context_history else self._cache_key(case_data)
+        result = self._response_cache.get(cache_key) if cache_key else None
+        
         try:
-            # Call GPT-4
-            response = await self.client.chat.completions.create(
-                model=self.model_id,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
+            if result is not None:
+                self._cache_hits += 1
+            else:
+                self._cache_misses += 1
+                
+                # Call GPT-4
+                response = await self.client.chat.completions.create(
+                    model=self.model_id,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    response_format={"type": "json_object"}
+                )
+                
+                # Parse response
+                result = json.loads(response.choices[0].message.content)
+                if cache_key:
+                    self._response_cache[cache_key] = result
             
-            # Parse response
-            result = json.loads(response.choices[0].message.content)
+            lookups = self._cache_hits + self._cache_misses
+            if lookups % _CACHE_METRIC_INTERVAL == 0:
+                log_performance_metric(
+                    "gpt4_response_cache_hit_ratio",
+                    self._cache_hits / lookups,
+                    unit="ratio"
+                )
             
             # Update context history
             self._update_context(input_data.case_id, messages, result)
@@ -105,6 +166,13 @@ class GPT4MedicalModel(BaseAIModel):
             "additional_notes": input_data.data.get("additional_notes", "")
         }
     
+    def _cache_key(self, case_data: Dict[str, Any]) -> str:
+        """Digest the case content, minus its ID, for the response cache."""
+        content = {k: v for k, v in case_data.items() if k != "case_id"}
+        return hashlib.sha256(
+            orjson.dumps(content, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+    
     def _build_messages(self, case_data: Dict[str, Any], case_id: str) -> List[Dict[str, str]]:
         """Build conversation messages with context."""
         messages = [
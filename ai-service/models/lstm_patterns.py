@@ -1,37 +1,96 @@
 """
 LSTM Pattern Analysis Model for Medical Treatment Sequences
 """
+import asyncio
 import torch
 import torch.nn as nn
 import numpy as np
 from typing import Any, Dict, List, Optional, Tuple
+import heapq
+import math
+import operator
 import time
+import zlib
 from loguru import logger
 from sklearn.preprocessing import MinMaxScaler
 
 from .base import BaseAIModel, ModelInput, ModelPrediction
 
 
+_record_date = operator.methodcaller("get", "date", "")
+
+# Categorical features fed through learned embeddings, mapped to their record key
+_CODE_FEATURES = {
+    "procedure_sequences": "procedure_code",
+    "diagnosis_progressions": "diagnosis_code"
+}
+
+# Recommendation issued for each detected (non-normal) pattern
+_REC_BY_PATTERN = {
+    "rapid_escalation": "Revisar necessidade de escalação rápida do tratamento",
+    "treatment_cycling": "Avaliar eficácia do tratamento atual",
+    "unnecessary_repetition": "Considerar consolidação de procedimentos repetidos",
+    "protocol_deviation": "Verificar aderência aos protocolos clínicos estabelecidos"
+}
+
+
+def _sigmoid(logit: float) -> float:
+    """Numerically stable scalar sigmoid."""
+    if logit >= 0:
+        return 1.0 / (1.0 + math.exp(-logit))
+    z = math.exp(logit)
+    return z / (1.0 + z)
+
+
 class LSTMModel(nn.Module):
     """LSTM neural network for sequence analysis."""
     
-    def __init__(self, input_dim: int, hidden_dim: int, output_dim: int, num_layers: int = 2):
+    def __init__(self, input_dim: int, hidden_dim: int, output_dim: int, num_layers: int = 2,
+                 num_code_fields: int = 0, code_vocab_size: int = 1024, code_embed_dim: int = 4):
         super(LSTMModel, self).__init__()
         self.hidden_dim = hidden_dim
         self.num_layers = num_layers
         
-        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
+        # One embedding table per categorical code field (index 0 = unknown/padding)
+        self.code_embeddings = nn.ModuleList(
+            nn.Embedding(code_vocab_size, code_embed_dim) for _ in range(num_code_fields)
+        )
+        lstm_input_dim = input_dim + num_code_fields * code_embed_dim
+        
+        self.lstm = nn.LSTM(lstm_input_dim, hidden_dim, num_layers, batch_first=True)
         self.fc = nn.Linear(hidden_dim, output_dim)
         self.sigmoid = nn.Sigmoid()
+        
+        # Initial (h, c) state, broadcast over the batch on each call
+        self.register_buffer("h0_buf", torch.zeros(num_layers, 1, hidden_dim), persistent=False)
+        self.register_buffer("c0_buf", torch.zeros(num_layers, 1, hidden_dim), persistent=False)
     
-    def forward(self, x):
-        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim)
-        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim)
+    def forward(self, x, codes: Optional[torch.Tensor] = None,
+                state: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+                return_logits: bool = False):
+        """Run the sequence through the LSTM.
+        
+        ``x`` holds the numeric features and ``codes`` the int64 code indices
+        (one column per embedding table). Returns the output probabilities (or
+        raw logits when ``return_logits`` is set) and the final ``(h, c)``
+        state, which streaming callers can pass back in to continue a sequence.
+        """
+        if codes is not None and len(self.code_embeddings) > 0:
+            embedded = [emb(codes[..., i]) for i, emb in enumerate(self.code_embeddings)]
+            x = torch.cat([x, *embedded], dim=-1)
+        
+        if state is None:
+            batch_size = x.size(0)
+            state = (
+                self.h0_buf.expand(-1, batch_size, -1).contiguous(),
+                self.c0_buf.expand(-1, batch_size, -1).contiguous()
+            )
         
-        out, _ = self.lstm(x, (h0, c0))
+        out, new_state = self.lstm(x, state)
         out = self.fc(out[:, -1, :])
-        out = self.sigmoid(out)
-        return out
+        if return_logits:
+            return out, new_state
+        return self.sigmoid(out), new_state
 
 
 class LSTMPatternModel(BaseAIModel):
@@ -41,10 +100,14 @@ class LSTMPatternModel(BaseAIModel):
         super().__init__(config)
         self.sequence_length = config.get("sequence_length", 30)
         self.input_features = config.get("features", [])
+        self.code_features = [f for f in self.input_features if f in _CODE_FEATURES]
+        self.numeric_features = [f for f in self.input_features if f not in _CODE_FEATURES]
+        self.code_vocab_size = config.get("code_vocab_size", 1024)
         self.hidden_dim = config.get("output_dimensions", 128)
         self.model = None
         self.scaler = None
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = self._select_device(config)
+        self._rng = np.random.default_rng(config.get("seed", 42))
         self.pattern_categories = [
             "normal_progression",
             "rapid_escalation",
@@ -53,13 +116,26 @@ class LSTMPatternModel(BaseAIModel):
             "protocol_deviation"
         ]
     
+    def _select_device(self, config: Dict[str, Any]) -> torch.device:
+        """Pick the inference device from the per-sequence workload.
+        
+        Small sequences are dominated by kernel launch and host/device copy
+        overhead on GPU, so they stay on CPU.
+        """
+        work = self.sequence_length * self.hidden_dim
+        if work > config.get("gpu_work_threshold", 32 * 1024) and torch.cuda.is_available():
+            return torch.device("cuda")
+        
+        return torch.device("cpu")
+    
     async def load_model(self) -> None:
         """Load or initialize LSTM model."""
         try:
             logger.info("Loading LSTM pattern analysis model")
             
-            # For demo, create a simple model
-            self._create_demo_model()
+            # For demo, create a simple model. Training and quantization are
+            # blocking CPU work; keep them off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._create_demo_model)
             
             self.is_loaded = True
             logger.info("LSTM pattern model loaded successfully")
@@ -68,54 +144,64 @@ class LSTMPatternModel(BaseAIModel):
             logger.error(f"Failed to load LSTM model: {e}")
             raise
     
+    async def unload(self) -> None:
+        """Release the LSTM network and scaler."""
+        self.model = None
+        self.scaler = None
+        await super().unload()
+    
     def _create_demo_model(self):
         """Create a demo LSTM model."""
-        input_dim = len(self.input_features)
+        input_dim = len(self.numeric_features)
         output_dim = len(self.pattern_categories)
         
         self.model = LSTMModel(
             input_dim=input_dim,
             hidden_dim=self.hidden_dim,
             output_dim=output_dim,
-            num_layers=2
+            num_layers=2,
+            num_code_fields=len(self.code_features),
+            code_vocab_size=self.code_vocab_size
         ).to(self.device)
         
         self.scaler = MinMaxScaler()
         
         # Train with synthetic data
         self._train_demo_model()
+        
+        # int8 dynamic quantization for CPU inference (weights only, no calibration)
+        if self.device.type == "cpu" and self.config.get("quantize_cpu", True):
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {nn.LSTM, nn.Linear}, dtype=torch.qint8
+            )
     
     def _train_demo_model(self):
         """Train model with synthetic data."""
         # Generate synthetic sequences
         n_samples = 500
-        sequences = []
-        labels = []
-        
-        for _ in range(n_samples):
-            # Create different pattern types
-            pattern_type = np.random.choice(len(self.pattern_categories))
-            sequence = self._generate_synthetic_sequence(pattern_type)
-            sequences.append(sequence)
-            
-            # One-hot encode label
-            label = np.zeros(len(self.pattern_categories))
-            label[pattern_type] = 1
-            labels.append(label)
+        n_categories = len(self.pattern_categories)
+        pattern_types = self._rng.integers(n_categories, size=n_samples)
         
-        # Convert to numpy arrays
-        X = np.array(sequences)
-        y = np.array(labels)
+        X = np.stack([self._generate_synthetic_sequence(int(pattern_type))
+                      for pattern_type in pattern_types])
+        codes = self._rng.integers(
+            1, self.code_vocab_size, size=(n_samples, self.sequence_length, len(self.code_features))
+        )
+        
+        # One-hot encode labels
+        y = np.zeros((n_samples, n_categories), dtype=np.float32)
+        y[np.arange(n_samples), pattern_types] = 1
         
         # Reshape for scaler
         n_samples, seq_len, n_features = X.shape
         X_reshaped = X.reshape(-1, n_features)
-        X_scaled = self.scaler.fit_transform(X_reshaped)
+        X_scaled = self.scaler.fit_transform(X_reshaped).astype(np.float32, copy=False)
         X_scaled = X_scaled.reshape(n_samples, seq_len, n_features)
         
-        # Convert to tensors
-        X_tensor = torch.FloatTensor(X_scaled).to(self.device)
-        y_tensor = torch.FloatTensor(y).to(self.device)
+        # Convert to tensors (float32 arrays are shared, not copied)
+        X_tensor = torch.from_numpy(X_scaled).to(self.device)
+        codes_tensor = torch.from_numpy(codes).to(self.device)
+        y_tensor = torch.from_numpy(y).to(self.device)
         
         # Simple training loop
         optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
@@ -124,7 +210,7 @@ class LSTMPatternModel(BaseAIModel):
         self.model.train()
         for epoch in range(50):
             optimizer.zero_grad()
-            outputs = self.model(X_tensor)
+            outputs, _ = self.model(X_tensor, codes_tensor)
             loss = criterion(outputs, y_tensor)
             loss.backward()
             optimizer.step()
@@ -133,12 +219,14 @@ class LSTMPatternModel(BaseAIModel):
     
     def _generate_synthetic_sequence(self, pattern_type: int) -> np.ndarray:
         """Generate synthetic sequence based on pattern type."""
-        sequence = np.random.randn(self.sequence_length, len(self.input_features))
+        rng = self._rng
+        n_features = len(self.numeric_features)
+        sequence = rng.standard_normal((self.sequence_length, n_features), dtype=np.float32)
         
         if pattern_type == 0:  # normal_progression
             # Gradual changes
             for i in range(1, self.sequence_length):
-                sequence[i] = sequence[i-1] + np.random.randn(len(self.input_features)) * 0.1
+                sequence[i] = sequence[i-1] + rng.standard_normal(n_features, dtype=np.float32) * 0.1
         
         elif pattern_type == 1:  # rapid_escalation
             # Sharp increases
@@ -155,12 +243,12 @@ class LSTMPatternModel(BaseAIModel):
             base = sequence[0]
             for i in range(self.sequence_length):
                 if i % 5 == 0:
-                    sequence[i] = base + np.random.randn(len(self.input_features)) * 0.05
+                    sequence[i] = base + rng.standard_normal(n_features, dtype=np.float32) * 0.05
         
         elif pattern_type == 4:  # protocol_deviation
             # Random spikes
             for i in range(0, self.sequence_length, 7):
-                sequence[i] += np.random.randn(len(self.input_features)) * 3
+                sequence[i] += rng.standard_normal(n_features, dtype=np.float32) * 3
         
         return sequence
     
@@ -175,22 +263,24 @@ class LSTMPatternModel(BaseAIModel):
             return self._create_insufficient_data_response(start_time)
         
         # Prepare sequence for model
-        prepared_sequence = self._prepare_sequence(sequence_data)
+        prepared_sequence, code_indices = self._prepare_sequence(sequence_data)
         
         # Scale the sequence
-        seq_reshaped = prepared_sequence.reshape(-1, len(self.input_features))
-        seq_scaled = self.scaler.transform(seq_reshaped)
-        seq_scaled = seq_scaled.reshape(1, self.sequence_length, len(self.input_features))
+        seq_reshaped = prepared_sequence.reshape(-1, len(self.numeric_features))
+        seq_scaled = self.scaler.transform(seq_reshaped).astype(np.float32, copy=False)
+        seq_scaled = seq_scaled.reshape(1, self.sequence_length, len(self.numeric_features))
         
-        # Convert to tensor
-        seq_tensor = torch.FloatTensor(seq_scaled).to(self.device)
+        # Convert to tensors
+        seq_tensor = torch.from_numpy(seq_scaled).to(self.device)
+        codes_tensor = torch.from_numpy(code_indices[np.newaxis]).to(self.device)
         
         # Get predictions
         with torch.no_grad():
-            pattern_probs = self.model(seq_tensor)
+            pattern_logits, _ = self.model(seq_tensor, codes_tensor, return_logits=True)
         
-        # Process results
-        pattern_scores = pattern_probs.cpu().numpy()[0]
+        # Process results (a handful of scalar sigmoids on the host is cheaper
+        # than another elementwise kernel on the device)
+        pattern_scores = [_sigmoid(logit) for logit in pattern_logits[0].tolist()]
         detected_patterns = self._identify_patterns(pattern_scores)
         
         # Calculate risk metrics
@@ -222,48 +312,52 @@ class LSTMPatternModel(BaseAIModel):
         if not treatment_history:
             return None
         
-        # Sort by date and take last N records
-        sorted_history = sorted(treatment_history, key=lambda x: x.get("date", ""))
-        return sorted_history[-self.sequence_length:]
+        # Take the N most recent records, oldest first; same-date records keep
+        # their input order, with the later ones winning, as a stable sort would
+        recent = heapq.nlargest(
+            self.sequence_length,
+            enumerate(treatment_history),
+            key=lambda item: (_record_date(item[1]), item[0])
+        )
+        return [record for _, record in reversed(recent)]
     
-    def _prepare_sequence(self, sequence_data: List[Dict[str, Any]]) -> np.ndarray:
-        """Prepare sequence data for LSTM input."""
-        prepared = []
+    def _prepare_sequence(self, sequence_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepare sequence data for LSTM input.
         
-        for record in sequence_data:
-            features = []
-            
+        Returns the numeric feature matrix and the matching matrix of code
+        indices for the embedding tables, both left-padded to sequence_length.
+        """
+        prepared = np.zeros((self.sequence_length, len(self.numeric_features)), dtype=np.float32)
+        code_indices = np.zeros((self.sequence_length, len(self.code_features)), dtype=np.int64)
+        offset = self.sequence_length - len(sequence_data)
+        
+        for row, record in enumerate(sequence_data, start=offset):
             # Extract features based on configuration
-            for feature_name in self.input_features:
-                if feature_name == "procedure_sequences":
-                    # Convert procedure code to numeric
-                    proc_code = record.get("procedure_code", "0")
-                    features.append(float(hash(proc_code) % 1000) / 1000)
-                
-                elif feature_name == "diagnosis_progressions":
-                    # Convert diagnosis to numeric
-                    diag_code = record.get("diagnosis_code", "0")
-                    features.append(float(hash(diag_code) % 1000) / 1000)
-                
-                elif feature_name == "treatment_patterns":
+            for col, feature_name in enumerate(self.numeric_features):
+                if feature_name == "treatment_patterns":
                     # Treatment type encoding
-                    treatment_type = record.get("treatment_type", 0)
-                    features.append(float(treatment_type))
+                    prepared[row, col] = float(record.get("treatment_type", 0))
                 
                 elif feature_name == "cost_trajectories":
                     # Normalized cost
                     cost = record.get("cost", 0)
-                    features.append(min(cost / 10000, 10.0))  # Cap at 10
+                    prepared[row, col] = min(cost / 10000, 10.0)  # Cap at 10
             
-            prepared.append(features)
+            for col, feature_name in enumerate(self.code_features):
+                code = record.get(_CODE_FEATURES[feature_name], "0")
+                code_indices[row, col] = self._code_index(code)
         
-        # Pad sequence if necessary
-        while len(prepared) < self.sequence_length:
-            prepared.insert(0, [0] * len(self.input_features))
+        return prepared, code_indices
+    
+    def _code_index(self, code: Any) -> int:
+        """Map a code to its embedding index.
         
-        return np.array(prepared)
+        CRC32 gives every worker and restart the same index for a code; row 0
+        is left for padding.
+        """
+        return zlib.crc32(str(code).encode()) % (self.code_vocab_size - 1) + 1
     
-    def _identify_patterns(self, pattern_scores: np.ndarray) -> List[Dict[str, Any]]:
+    def _identify_patterns(self, pattern_scores: List[float]) -> List[Dict[str, Any]]:
         """Identify significant patterns from scores."""
         patterns = []
         threshold = 0.5
@@ -368,17 +462,10 @@ class LSTMPatternModel(BaseAIModel):
     def _generate_recommendations(self, patterns: List[Dict], 
                                 metrics: Dict[str, float]) -> List[str]:
         """Generate recommendations based on patterns and metrics."""
-        recommendations = []
-        
-        for pattern in patterns:
-            if pattern["type"] == "rapid_escalation":
-                recommendations.append("Revisar necessidade de escalação rápida do tratamento")
-            elif pattern["type"] == "treatment_cycling":
-                recommendations.append("Avaliar eficácia do tratamento atual")
-            elif pattern["type"] == "unnecessary_repetition":
-                recommendations.append("Considerar consolidação de procedimentos repetidos")
-            elif pattern["type"] == "protocol_deviation":
-                recommendations.append("Verificar aderência aos protocolos clínicos estabelecidos")
+        recommendations = [
+            _REC_BY_PATTERN[pattern["type"]] for pattern in patterns
+            if pattern["type"] in _REC_BY_PATTERN
+        ]
         
         if metrics.get("cost_acceleration", 0) > 0.5:
             recommendations.append("Monitorar aceleração dos custos do tratamento")
@@ -2,13 +2,40 @@
 Chat Service
 Handles chat interactions with AI models
 """
-from typing import Dict, Any, Optional
+from itertools import chain
+from typing import Dict, Any, List, Optional
 from loguru import logger
 
 from .model_manager import ModelManager
 from .context_manager import ContextManager
 
 
+# Static suggestion catalog, selected per case in get_smart_suggestions
+_DENIED_SUGGESTIONS = (
+    "Quais foram os principais motivos para a negativa?",
+    "Que documentos adicionais poderiam reverter esta decisão?"
+)
+_REVIEW_SUGGESTIONS = (
+    "Quais informações estão faltando para uma decisão definitiva?",
+)
+_RISK_SUGGESTIONS = (
+    "Quais indicadores de fraude foram identificados?",
+    "Como posso mitigar os riscos identificados?"
+)
+_COMPLIANCE_SUGGESTIONS = (
+    "Quais são os problemas de conformidade específicos?",
+)
+_RECOMMENDATION_SUGGESTIONS = (
+    "Pode detalhar as recomendações sugeridas?",
+)
+_GENERAL_SUGGESTIONS = (
+    "Compare este caso com casos similares aprovados",
+    "Quais são as melhores práticas para este tipo de procedimento?",
+    "Existe jurisprudência relevante para este caso?"
+)
+_HIGH_RISK_LEVELS = frozenset(("high", "critical"))
+
+
 class ChatService:
     """Service for handling chat interactions."""
     
@@ -58,38 +85,32 @@ class ChatService:
         if not context:
             return []
         
-        suggestions = []
         analysis_result = context.get("analysis_result", {})
+        selected = []
         
         # Based on decision
         decision = analysis_result.get("final_decision")
         if decision == "denied":
-            suggestions.append("Quais foram os principais motivos para a negativa?")
-            suggestions.append("Que documentos adicionais poderiam reverter esta decisão?")
+            selected.append(_DENIED_SUGGESTIONS)
         elif decision == "requires_review":
-            suggestions.append("Quais informações estão faltando para uma decisão definitiva?")
+            selected.append(_REVIEW_SUGGESTIONS)
         
         # Based on risk
         risk_level = analysis_result.get("risk_assessment", {}).get("level")
-        if risk_level in ["high", "critical"]:
-            suggestions.append("Quais indicadores de fraude foram identificados?")
-            suggestions.append("Como posso mitigar os riscos identificados?")
+        if risk_level in _HIGH_RISK_LEVELS:
+            selected.append(_RISK_SUGGESTIONS)
         
         # Based on compliance
         compliance = analysis_result.get("compliance_status", {})
         if not compliance.get("is_compliant", True):
-            suggestions.append("Quais são os problemas de conformidade específicos?")
+            selected.append(_COMPLIANCE_SUGGESTIONS)
         
         # Based on recommendations
         if analysis_result.get("recommendations"):
-            suggestions.append("Pode detalhar as recomendações sugeridas?")
+            selected.append(_RECOMMENDATION_SUGGESTIONS)
         
         # General helpful suggestions
-        suggestions.extend([
-            "Compare este caso com casos similares aprovados",
-            "Quais são as melhores práticas para este tipo de procedimento?",
-            "Existe jurisprudência relevante para este caso?"
-        ])
+        selected.append(_GENERAL_SUGGESTIONS)
         
         # Return unique suggestions
-        return list(dict.fromkeys(suggestions))[:8]
\ No newline at end of file
+        return list(dict.fromkeys(chain.from_iterable(selected)))[:8]
\ No newline at end of file
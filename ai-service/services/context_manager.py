@@ -3,15 +3,25 @@ Context Manager Service
 Manages conversation context and case history
 """
 import redis.asyncio as redis
-import json
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import orjson
+from typing import Dict, Any, List, Optional, Tuple
+from collections import deque
+from datetime import datetime
+from itertools import islice
 import asyncio
+import time
+from cachetools import TTLCache
 from loguru import logger
 
 from config.settings import settings
 
 
+# Sorted sets of case ids with stored context / chat history, scored by expiry
+# time so statistics can drop expired ids before counting
+CASES_INDEX_KEY = "stats:cases:by_expiry"
+CHATS_INDEX_KEY = "stats:chats:by_expiry"
+
+
 class ContextManager:
     """Manages context for cases and conversations."""
     
@@ -20,14 +30,21 @@ class ContextManager:
         self.context_ttl = 3600 * 24  # 24 hours
         self.history_ttl = 3600 * 24 * 30  # 30 days
         self._lock = asyncio.Lock()
+        
+        # In-memory fallback when Redis is unavailable, expiring like the Redis keys
+        self._memory_contexts: TTLCache = TTLCache(maxsize=100_000, ttl=self.context_ttl)
+        self._memory_chats: TTLCache = TTLCache(maxsize=100_000, ttl=self.history_ttl)
     
     async def initialize(self):
         """Initialize Redis connection."""
         try:
+            # Replies stay raw bytes: orjson decodes them directly
             self.redis_client = await redis.from_url(
                 settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
+                max_connections=settings.redis_max_connections,
+                protocol=3,
+                decode_responses=False,
+                health_check_interval=30
             )
             await self.redis_client.ping()
             logger.info("Context Manager initialized with Redis")
@@ -35,7 +52,6 @@ class ContextManager:
             logger.error(f"Failed to connect to Redis: {e}")
             # Fallback to in-memory storage
             self.redis_client = None
-            self._memory_store = {}
             logger.warning("Using in-memory context storage")
     
     async def store_analysis_context(self, case_id: str, case_data: Dict[str, Any], 
@@ -50,13 +66,16 @@ class ContextManager:
         key = f"context:case:{case_id}"
         
         if self.redis_client:
-            await self.redis_client.setex(
-                key,
-                self.context_ttl,
-                json.dumps(context)
-            )
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(
+                    key,
+                    self.context_ttl,
+                    orjson.dumps(context)
+                )
+                pipe.zadd(CASES_INDEX_KEY, {case_id: time.time() + self.context_ttl})
+                await pipe.execute()
         else:
-            self._memory_store[key] = context
+            self._memory_contexts[case_id] = context
     
     async def get_case_context(self, case_id: str) -> Optional[Dict[str, Any]]:
         """Get context for a specific case."""
@@ -65,9 +84,9 @@ class ContextManager:
         if self.redis_client:
             data = await self.redis_client.get(key)
             if data:
-                return json.loads(data)
+                return orjson.loads(data)
         else:
-            return self._memory_store.get(key)
+            return self._memory_contexts.get(case_id)
         
         return None
     
@@ -83,17 +102,21 @@ class ContextManager:
         key = f"chat:history:{case_id}"
         
         if self.redis_client:
-            # Store in a list
-            await self.redis_client.lpush(key, json.dumps(message))
-            await self.redis_client.expire(key, self.history_ttl)
-            # Keep only last 100 messages
-            await self.redis_client.ltrim(key, 0, 99)
+            # Store in a list, keeping only the last 100 messages (one round trip)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, orjson.dumps(message))
+                pipe.expire(key, self.history_ttl)
+                pipe.ltrim(key, 0, 99)
+                pipe.zadd(CHATS_INDEX_KEY, {case_id: time.time() + self.history_ttl})
+                await pipe.execute()
         else:
-            if key not in self._memory_store:
-                self._memory_store[key] = []
-            self._memory_store[key].insert(0, message)
-            # Keep only last 100 messages
-            self._memory_store[key] = self._memory_store[key][:100]
+            # Newest first, keeping only the last 100 messages
+            history = self._memory_chats.get(case_id)
+            if history is None:
+                history = deque(maxlen=100)
+            history.appendleft(message)
+            # Re-assign to refresh the TTL, like EXPIRE on the Redis list
+            self._memory_chats[case_id] = history
     
     async def get_chat_history(self, case_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Get chat history for a case."""
@@ -101,15 +124,28 @@ class ContextManager:
         
         if self.redis_client:
             messages = await self.redis_client.lrange(key, 0, limit - 1)
-            return [json.loads(msg) for msg in messages]
+            return [orjson.loads(msg) for msg in messages]
         else:
-            history = self._memory_store.get(key, [])
-            return history[:limit]
+            history = self._memory_chats.get(case_id, ())
+            return list(islice(history, limit))
+    
+    async def get_case_bundle(self, case_id: str, 
+                              limit: int = 20) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Get a case's context and latest chat messages in one Redis round trip."""
+        if self.redis_client:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(f"context:case:{case_id}")
+                pipe.lrange(f"chat:history:{case_id}", 0, limit - 1)
+                context_data, messages = await pipe.execute()
+            
+            context = orjson.loads(context_data) if context_data else None
+            return context, [orjson.loads(msg) for msg in messages]
+        
+        return await self.get_case_context(case_id), await self.get_chat_history(case_id, limit)
     
     async def get_case_history(self, case_id: str) -> Optional[Dict[str, Any]]:
         """Get complete history for a case including analysis and chat."""
-        context = await self.get_case_context(case_id)
-        chat_history = await self.get_chat_history(case_id)
+        context, chat_history = await self.get_case_bundle(case_id)
         
         if not context and not chat_history:
             return None
@@ -129,67 +165,71 @@ class ContextManager:
         ]
         
         if self.redis_client:
-            await self.redis_client.delete(*keys)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                pipe.zrem(CASES_INDEX_KEY, case_id)
+                pipe.zrem(CHATS_INDEX_KEY, case_id)
+                await pipe.execute()
         else:
-            for key in keys:
-                self._memory_store.pop(key, None)
+            self._memory_contexts.pop(case_id, None)
+            self._memory_chats.pop(case_id, None)
     
     async def search_cases_by_pattern(self, pattern: str) -> List[str]:
         """Search for cases matching a pattern."""
         if self.redis_client:
-            keys = await self.redis_client.keys(f"context:case:*{pattern}*")
-            return [key.replace("context:case:", "") for key in keys]
+            # SCAN walks the keyspace incrementally instead of blocking Redis like KEYS
+            return [
+                key.decode().replace("context:case:", "")
+                async for key in self.redis_client.scan_iter(
+                    match=f"context:case:*{pattern}*", count=500
+                )
+            ]
         else:
-            matching = []
-            for key in self._memory_store:
-                if key.startswith("context:case:") and pattern in key:
-                    matching.append(key.replace("context:case:", ""))
-            return matching
+            return [case_id for case_id in self._memory_contexts if pattern in case_id]
     
     async def get_statistics(self) -> Dict[str, Any]:
         """Get context manager statistics."""
         if self.redis_client:
-            info = await self.redis_client.info()
-            case_keys = await self.redis_client.keys("context:case:*")
-            chat_keys = await self.redis_client.keys("chat:history:*")
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                now = time.time()
+                pipe.info()
+                pipe.zremrangebyscore(CASES_INDEX_KEY, "-inf", now)
+                pipe.zremrangebyscore(CHATS_INDEX_KEY, "-inf", now)
+                pipe.zcard(CASES_INDEX_KEY)
+                pipe.zcard(CHATS_INDEX_KEY)
+                info, _, _, case_count, chat_count = await pipe.execute()
             
             return {
-                "total_cases": len(case_keys),
-                "total_conversations": len(chat_keys),
+                "total_cases": case_count,
+                "total_conversations": chat_count,
                 "redis_memory_used": info.get("used_memory_human", "N/A"),
                 "redis_connected": True
             }
         else:
-            case_count = sum(1 for k in self._memory_store if k.startswith("context:case:"))
-            chat_count = sum(1 for k in self._memory_store if k.startswith("chat:history:"))
+            self._memory_contexts.expire()
+            self._memory_chats.expire()
             
             return {
-                "total_cases": case_count,
-                "total_conversations": chat_count,
+                "total_cases": len(self._memory_contexts),
+                "total_conversations": len(self._memory_chats),
                 "memory_storage": True,
                 "redis_connected": False
             }
     
     async def cleanup_old_contexts(self, days: int = 30):
-        """Clean up contexts older than specified days."""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        """Clean up expired contexts.
+        
+        Both backends expire entries by TTL (``context_ttl``/``history_ttl``,
+        both at most 30 days), so this only purges expired in-memory entries
+        eagerly; ``days`` is kept for API compatibility.
+        """
         cleaned = 0
         
         if self.redis_client:
-            # Would need to iterate through keys and check timestamps
-            # This is a simplified version
+            # Redis expires keys on its own
             pass
         else:
-            keys_to_remove = []
-            for key, value in self._memory_store.items():
-                if isinstance(value, dict) and "timestamp" in value:
-                    timestamp = datetime.fromisoformat(value["timestamp"])
-                    if timestamp < cutoff_date:
-                        keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self._memory_store[key]
-                cleaned += 1
+            cleaned = len(self._memory_contexts.expire()) + len(self._memory_chats.expire())
         
         logger.info(f"Cleaned up {cleaned} old contexts")
         return cleaned
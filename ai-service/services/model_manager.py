@@ -3,10 +3,22 @@ Model Manager Service
 Handles loading, unloading, and management of AI models
 """
 import asyncio
-from typing import Dict, Any, List, Optional
+import gc
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 from loguru import logger
 import yaml
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 from models import (
     BERTMedicalModel,
     GPT4MedicalModel,
@@ -17,50 +29,66 @@ from models import (
 from config.settings import settings
 
 
+MODEL_CONFIG_PATH = "config/ai_models.yaml"
+
+# Models loaded at startup and required for readiness
+_ESSENTIAL_MODELS = frozenset({"bert_medical", "gpt4_medical", "decision_pipeline"})
+
+
 class ModelManager:
     """Manages AI model lifecycle and access."""
     
     def __init__(self):
         self.models: Dict[str, Any] = {}
+        # (model class, config) per model name; instances are created on first use
+        self._factories: Dict[str, Tuple[type, Dict[str, Any]]] = {}
+        # Only models that finished loading; get_model is a single lookup here
+        self._ready_models: Dict[str, Any] = {}
+        # Admin API views, rebuilt only after a load/unload
+        self._list_cache: Optional[List[Dict[str, Any]]] = None
+        self._info_cache: Dict[str, Dict[str, Any]] = {}
         self.model_configs = self._load_model_configs()
-        self._lock = asyncio.Lock()
+        # Configs are fixed once loaded, so the pipeline config is built here once
+        self._pipeline_config = self._build_pipeline_config(self.model_configs)
+        # One lock per model so loading one model never blocks another
+        self._locks: Dict[str, asyncio.Lock] = {}
     
     def _load_model_configs(self) -> Dict[str, Any]:
-        """Load model configurations from YAML file."""
+        """Load model configurations from YAML file.
+        
+        Prefers the build-time baked module (config/ai_models_baked.py) when
+        it matches the YAML; otherwise the parsed YAML is cached in a JSON
+        sidecar keyed by the file's mtime, so warm starts skip YAML parsing.
+        """
+        baked = self._load_baked_configs()
+        if baked is not None:
+            return baked
+        
         try:
-            with open("config/ai_models.yaml", "r") as f:
-                config = yaml.safe_load(f)
+            mtime = os.stat(MODEL_CONFIG_PATH).st_mtime_ns
+            sidecar_path = f"{MODEL_CONFIG_PATH}.{mtime}.cache.json"
+            
+            if os.path.exists(sidecar_path):
+                with open(sidecar_path, "r") as f:
+                    config = json.load(f)
+            else:
+                with open(MODEL_CONFIG_PATH, "r") as f:
+                    config = yaml.load(f, Loader=_YamlLoader)
+                self._write_config_sidecar(config, sidecar_path)
+            
             return config.get("models", {})
         except Exception as e:
             logger.error(f"Failed to load model configs: {e}")
             return {}
     
-    async def initialize(self):
-        """Initialize model manager and load essential models."""
-        logger.info("Initializing Model Manager...")
-        
-        # Define model instances
-        model_instances = {
-            "bert_medical": BERTMedicalModel(
-                self.model_configs.get("bert-medical", {})
-            ),
-            "gpt4_medical": GPT4MedicalModel(
-                self.model_configs.get("gpt-4-medical", {})
-            ),
-            "xgboost_fraud": XGBoostFraudModel(
-                self.model_configs.get("xgboost-fraud", {})
-            ),
-            "lstm_patterns": LSTMPatternModel(
-                self.model_configs.get("lstm-patterns", {})
-            )
-        }
-        
-        # Create decision pipeline with all models
-        pipeline_config = {
-            "bert_config": self.model_configs.get("bert-medical", {}),
-            "gpt4_config": self.model_configs.get("gpt-4-medical", {}),
-            "xgboost_config": self.model_configs.get("xgboost-fraud", {}),
-            "lstm_config": self.model_configs.get("lstm-patterns", {}),
+    @staticmethod
+    def _build_pipeline_config(model_configs: Dict[str, Any]) -> Dict[str, Any]:
+        """Assemble the AuditDecisionPipeline config from the model configs."""
+        return {
+            "bert_config": model_configs.get("bert-medical", {}),
+            "gpt4_config": model_configs.get("gpt-4-medical", {}),
+            "xgboost_config": model_configs.get("xgboost-fraud", {}),
+            "lstm_config": model_configs.get("lstm-patterns", {}),
             "decision_threshold": 0.75,
             "require_explanation": True,
             "enable_parallel": True,
@@ -71,35 +99,110 @@ class ModelManager:
                 "pattern_analysis": 0.2
             }
         }
+    
+    def _load_baked_configs(self) -> Optional[Dict[str, Any]]:
+        """Return the baked model configs if present and built from the current YAML."""
+        try:
+            from config import ai_models_baked
+        except ImportError:
+            return None
         
-        model_instances["decision_pipeline"] = AuditDecisionPipeline(pipeline_config)
+        try:
+            with open(MODEL_CONFIG_PATH, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            # Deployed without the YAML source, the baked module is authoritative
+            return ai_models_baked.MODELS
         
-        # Store model instances
-        self.models = model_instances
+        if digest != ai_models_baked.SOURCE_DIGEST:
+            logger.warning("Baked model configs are stale, falling back to YAML")
+            return None
         
-        # Load essential models
-        essential_models = ["bert_medical", "gpt4_medical", "decision_pipeline"]
-        for model_name in essential_models:
-            await self.load_model(model_name)
+        return ai_models_baked.MODELS
+    
+    def _write_config_sidecar(self, config: Dict[str, Any], sidecar_path: str):
+        """Atomically write the parsed config sidecar and drop stale ones."""
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(sidecar_path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(config, f)
+            os.replace(tmp_path, sidecar_path)
+            tmp_path = None
+            
+            for stale_path in glob.glob(f"{MODEL_CONFIG_PATH}.*.cache.json"):
+                if stale_path != sidecar_path:
+                    os.remove(stale_path)
+        except OSError as e:
+            logger.warning(f"Could not write model config cache: {e}")
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    async def initialize(self):
+        """Initialize model manager and load essential models."""
+        logger.info("Initializing Model Manager...")
+        
+        # Define model factories
+        self._factories = {
+            "bert_medical": (BERTMedicalModel, self.model_configs.get("bert-medical", {})),
+            "gpt4_medical": (GPT4MedicalModel, self.model_configs.get("gpt-4-medical", {})),
+            "xgboost_fraud": (XGBoostFraudModel, self.model_configs.get("xgboost-fraud", {})),
+            "lstm_patterns": (LSTMPatternModel, self.model_configs.get("lstm-patterns", {}))
+        }
+        
+        # Create decision pipeline with all models
+        self._factories["decision_pipeline"] = (AuditDecisionPipeline, self._pipeline_config)
+        
+        # Load essential models concurrently
+        await asyncio.gather(*(self.load_model(model_name) for model_name in _ESSENTIAL_MODELS))
         
         logger.info("Model Manager initialized successfully")
     
+    def _lock_for(self, model_name: str) -> asyncio.Lock:
+        """Get the lock serializing load/unload of one model.
+        
+        No await happens between the lookup and the insert, so creating the
+        lock needs no extra guard on the event loop.
+        """
+        lock = self._locks.get(model_name)
+        
+        if lock is None:
+            lock = self._locks[model_name] = asyncio.Lock()
+        
+        return lock
+    
+    def _get_or_create(self, model_name: str) -> Any:
+        """Get a model instance, constructing it on first use."""
+        model = self.models.get(model_name)
+        
+        if model is None:
+            model_class, model_config = self._factories[model_name]
+            model = self.models[model_name] = model_class(model_config)
+        
+        return model
+    
     async def load_model(self, model_name: str) -> bool:
         """Load a specific model."""
-        async with self._lock:
-            if model_name not in self.models:
-                logger.error(f"Model {model_name} not found")
-                return False
-            
-            model = self.models[model_name]
+        if model_name not in self._factories:
+            logger.error(f"Model {model_name} not found")
+            return False
+        
+        async with self._lock_for(model_name):
+            self._invalidate_views(model_name)
+            model = self._get_or_create(model_name)
             
             if model.is_loaded:
                 logger.info(f"Model {model_name} already loaded")
+                self._ready_models[model_name] = model
                 return True
             
             try:
                 logger.info(f"Loading model {model_name}...")
+                # Models run their blocking load work in an executor themselves
                 await model.load_model()
+                self._ready_models[model_name] = model
+                self._invalidate_views(model_name)
                 logger.info(f"Model {model_name} loaded successfully")
                 return True
             except Exception as e:
@@ -108,79 +211,107 @@ class ModelManager:
     
     async def unload_model(self, model_name: str) -> bool:
         """Unload a specific model."""
-        async with self._lock:
-            if model_name not in self.models:
-                logger.error(f"Model {model_name} not found")
-                return False
-            
-            model = self.models[model_name]
+        if model_name not in self._factories:
+            logger.error(f"Model {model_name} not found")
+            return False
+        
+        async with self._lock_for(model_name):
+            model = self.models.get(model_name)
+            if model is None:
+                # Never instantiated, nothing to release
+                return True
             
-            # For now, just mark as unloaded
-            # In production, would free memory/resources
-            model.is_loaded = False
+            await model.unload()
+            # Drop our reference too; the factory recreates it on next load
+            del self.models[model_name]
+            self._ready_models.pop(model_name, None)
+            self._invalidate_views(model_name)
+            self._release_memory()
             logger.info(f"Model {model_name} unloaded")
             return True
     
+    def _invalidate_views(self, model_name: str):
+        """Drop cached list_models/get_model_info output after a state change."""
+        self._list_cache = None
+        self._info_cache.pop(model_name, None)
+    
+    def _release_memory(self):
+        """Collect freed model objects and return cached GPU memory."""
+        gc.collect()
+        
+        try:
+            import torch
+            
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+    
     async def reload_all_models(self) -> Dict[str, bool]:
         """Reload all models."""
-        results = {}
+        model_names = list(self._factories)
+        results = await asyncio.gather(*(self._reload_model(name) for name in model_names))
         
-        for model_name in self.models:
-            # Unload first
-            await self.unload_model(model_name)
-            # Then load
-            results[model_name] = await self.load_model(model_name)
-        
-        return results
+        return dict(zip(model_names, results))
+    
+    async def _reload_model(self, model_name: str) -> bool:
+        """Unload then load a single model."""
+        await self.unload_model(model_name)
+        return await self.load_model(model_name)
     
     def get_model(self, model_name: str) -> Optional[Any]:
         """Get a specific model instance."""
-        model = self.models.get(model_name)
-        
-        if model and model.is_loaded:
-            return model
-        
-        return None
+        return self._ready_models.get(model_name)
     
     def list_models(self) -> List[Dict[str, Any]]:
         """List all available models."""
-        model_list = []
+        if self._list_cache is not None:
+            return self._list_cache
+        
+        self._list_cache = [self._describe_model(name) for name in self._factories]
+        return self._list_cache
+    
+    def _describe_model(self, name: str) -> Dict[str, Any]:
+        """Summarize one model for list_models."""
+        model = self.models.get(name)
         
-        for name, model in self.models.items():
-            model_info = {
+        if model is not None:
+            return {
                 "name": name,
-                "type": model.__class__.__name__,
+                "type": type(model).__name__,
                 "version": model.model_version,
                 "is_loaded": model.is_loaded,
                 "description": model.model_name
             }
-            model_list.append(model_info)
         
-        return model_list
+        # Not instantiated yet: describe it from its config
+        model_class, model_config = self._factories[name]
+        return {
+            "name": name,
+            "type": model_class.__name__,
+            "version": model_config.get("version", "0.0.0"),
+            "is_loaded": False,
+            "description": model_config.get("name", "Unknown Model")
+        }
     
     def get_model_info(self, model_name: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific model."""
-        model = self.models.get(model_name)
-        
-        if not model:
+        if model_name not in self._factories:
             return None
         
-        return model.get_model_info()
+        model_info = self._info_cache.get(model_name)
+        if model_info is None:
+            model_info = self._info_cache[model_name] = self._get_or_create(model_name).get_model_info()
+        
+        return model_info
     
     def get_loaded_models(self) -> List[str]:
         """Get list of loaded model names."""
-        return [name for name, model in self.models.items() if model.is_loaded]
+        return list(self._ready_models)
     
     async def check_models_ready(self) -> bool:
         """Check if all essential models are ready."""
-        essential_models = ["bert_medical", "gpt4_medical", "decision_pipeline"]
-        
-        for model_name in essential_models:
-            model = self.models.get(model_name)
-            if not model or not model.is_loaded:
-                return False
-        
-        return True
+        return _ESSENTIAL_MODELS.issubset(self._ready_models)
     
     async def shutdown(self):
         """Shutdown model manager and cleanup resources."""
@@ -195,13 +326,19 @@ class ModelManager:
 
 # Singleton instance
 _model_manager: Optional[ModelManager] = None
+_model_manager_lock = threading.Lock()
 
 
 def get_model_manager() -> ModelManager:
     """Get model manager instance."""
     global _model_manager
     
-    if _model_manager is None:
-        _model_manager = ModelManager()
+    # Fast path: no locking once the instance exists
+    if _model_manager is not None:
+        return _model_manager
+    
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelManager()
     
     return _model_manager
\ No newline at end of file
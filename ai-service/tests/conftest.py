@@ -3,10 +3,12 @@ Pytest configuration and fixtures for AI service tests.
 """
 import os
 import sys
+import uuid
+from types import SimpleNamespace
 from typing import Generator, AsyncGenerator
 import pytest
 import asyncio
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi import FastAPI
@@ -21,6 +23,14 @@ from app.config import get_settings
 from app.database import Base
 from app.models import User, AuditCase, AIAnalysis
 
+try:
+    import uvloop
+    
+    # event_loop below builds its loop from the active policy
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 # Override settings for testing
 os.environ["ENVIRONMENT"] = "test"
 os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
@@ -28,6 +38,22 @@ os.environ["REDIS_URL"] = "redis://localhost:6379/15"
 os.environ["JWT_SECRET"] = "test-secret-key"
 os.environ["OPENAI_API_KEY"] = "test-api-key"
 
+# Static OpenAI payloads; plain attribute objects are far cheaper than nested Mocks
+_FAKE_COMPLETION = SimpleNamespace(
+    choices=[
+        SimpleNamespace(
+            message=SimpleNamespace(
+                content="This is a mocked AI response for testing."
+            )
+        )
+    ]
+)
+_FAKE_EMBEDDING = SimpleNamespace(
+    data=[
+        SimpleNamespace(embedding=[0.1] * 1536)  # Mock embedding vector
+    ]
+)
+
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -44,9 +70,9 @@ async def test_app() -> FastAPI:
     return app
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 async def async_engine():
-    """Create an async SQLAlchemy engine for testing."""
+    """Create an async SQLAlchemy engine for testing, with the schema built once."""
     engine = create_async_engine(
         "sqlite+aiosqlite:///:memory:",
         echo=False,
@@ -63,33 +89,61 @@ async def async_engine():
 
 @pytest.fixture(scope="function")
 async def async_session(async_engine) -> AsyncGenerator[AsyncSession, None]:
-    """Create an async database session for testing."""
-    async_session_maker = sessionmaker(
-        async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
-    
-    async with async_session_maker() as session:
-        yield session
+    """Create an async database session rolled back after each test."""
+    async with async_engine.connect() as conn:
+        trans = await conn.begin()
+        
+        # Commits inside the test only release a savepoint; the outer
+        # transaction is rolled back so every test starts from a clean schema
+        async_session_maker = sessionmaker(
+            bind=conn,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        
+        async with async_session_maker() as session:
+            yield session
+        
+        await trans.rollback()
 
 
 @pytest.fixture(scope="function")
 async def client(test_app: FastAPI, async_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     """Create an async test client."""
-    async with AsyncClient(app=test_app, base_url="http://test") as ac:
+    transport = ASGITransport(app=test_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
 
 
+@pytest.fixture(scope="session")
+def _fake_redis_server():
+    """One in-process fake Redis server shared by the test session."""
+    import fakeredis
+    
+    return fakeredis.FakeServer()
+
+
 @pytest.fixture(scope="function")
-async def redis_client() -> AsyncGenerator[redis.Redis, None]:
-    """Create a Redis client for testing."""
-    client = redis.Redis(
-        host="localhost",
-        port=6379,
-        db=15,  # Use a separate DB for tests
-        decode_responses=True,
-    )
+async def redis_client(request) -> AsyncGenerator[redis.Redis, None]:
+    """Create a Redis client for testing.
+    
+    Uses in-process fakeredis unless USE_REAL_REDIS=1, e.g. in integration CI.
+    """
+    if os.environ.get("USE_REAL_REDIS") == "1":
+        client = redis.Redis(
+            host="localhost",
+            port=6379,
+            db=15,  # Use a separate DB for tests
+            decode_responses=True,
+        )
+    else:
+        import fakeredis.aioredis
+        
+        client = fakeredis.aioredis.FakeRedis(
+            server=request.getfixturevalue("_fake_redis_server"),
+            decode_responses=True,
+        )
     
     # Clear the test database
     await client.flushdb()
@@ -99,14 +153,13 @@ async def redis_client() -> AsyncGenerator[redis.Redis, None]:
     await client.close()
 
 
-@pytest.fixture
-async def auth_headers(client: AsyncClient) -> dict:
-    """Create authentication headers for testing."""
+async def _register_and_login(client: AsyncClient, email: str) -> str:
+    """Register a test user and return its access token."""
     # Create a test user
-    response = await client.post(
+    await client.post(
         "/api/v1/auth/register",
         json={
-            "email": "test@example.com",
+            "email": email,
             "password": "TestPassword123!",
             "name": "Test User",
             "role": "auditor",
@@ -117,42 +170,65 @@ async def auth_headers(client: AsyncClient) -> dict:
     response = await client.post(
         "/api/v1/auth/login",
         json={
-            "email": "test@example.com",
+            "email": email,
             "password": "TestPassword123!",
         },
     )
     
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+    return response.json()["access_token"]
+
+
+@pytest.fixture(scope="session")
+async def _session_auth_token(test_app: FastAPI) -> str:
+    """Register and log in once per test session."""
+    transport = ASGITransport(app=test_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        return await _register_and_login(ac, "test@example.com")
 
 
 @pytest.fixture
-def mock_openai_client():
-    """Mock OpenAI client for testing."""
-    mock = AsyncMock()
-    
+def auth_headers(_session_auth_token: str) -> dict:
+    """Create authentication headers for testing."""
+    return {"Authorization": f"Bearer {_session_auth_token}"}
+
+
+@pytest.fixture
+async def isolated_auth_headers(client: AsyncClient) -> dict:
+    """Authentication headers for a user registered just for this test."""
+    token = await _register_and_login(client, f"test-{uuid.uuid4().hex}@example.com")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _configure_openai_mock(mock: AsyncMock) -> None:
+    """Install the default OpenAI responses on a mock client."""
     # Mock chat completion
-    mock.chat.completions.create = AsyncMock(
-        return_value=Mock(
-            choices=[
-                Mock(
-                    message=Mock(
-                        content="This is a mocked AI response for testing."
-                    )
-                )
-            ]
-        )
-    )
+    mock.chat.completions.create = AsyncMock(return_value=_FAKE_COMPLETION)
     
     # Mock embeddings
-    mock.embeddings.create = AsyncMock(
-        return_value=Mock(
-            data=[
-                Mock(embedding=[0.1] * 1536)  # Mock embedding vector
-            ]
-        )
-    )
-    
+    mock.embeddings.create = AsyncMock(return_value=_FAKE_EMBEDDING)
+
+
+def _configure_ml_model_mock(mock: Mock) -> None:
+    """Install the default predictions on a mock ML model."""
+    mock.predict = Mock(return_value={
+        "risk_score": 0.75,
+        "confidence": 0.85,
+        "factors": ["high_complexity", "multiple_conditions"],
+    })
+    mock.predict_proba = Mock(return_value=[[0.25, 0.75]])
+
+
+_SHARED_MOCK_DEFAULTS = {
+    "mock_openai_client": _configure_openai_mock,
+    "mock_ml_model": _configure_ml_model_mock,
+}
+
+
+@pytest.fixture(scope="module")
+def mock_openai_client():
+    """Mock OpenAI client for testing, shared across a module."""
+    mock = AsyncMock()
+    _configure_openai_mock(mock)
     return mock
 
 
@@ -204,19 +280,26 @@ async def sample_case(async_session: AsyncSession, sample_user: User) -> AuditCa
     return case
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_ml_model():
-    """Mock machine learning model for testing."""
+    """Mock machine learning model for testing, shared across a module."""
     mock = Mock()
-    mock.predict = Mock(return_value={
-        "risk_score": 0.75,
-        "confidence": 0.85,
-        "factors": ["high_complexity", "multiple_conditions"],
-    })
-    mock.predict_proba = Mock(return_value=[[0.25, 0.75]])
+    _configure_ml_model_mock(mock)
     return mock
 
 
+@pytest.fixture(autouse=True)
+def _reset_shared_mocks(request):
+    """Restore module-scoped mocks to their defaults before each test that uses them."""
+    for name, configure in _SHARED_MOCK_DEFAULTS.items():
+        if name in request.fixturenames:
+            # Drop calls plus any return_value/side_effect a previous test set,
+            # then reinstall the default payloads (also undoing replaced children)
+            mock = request.getfixturevalue(name)
+            mock.reset_mock(return_value=True, side_effect=True)
+            configure(mock)
+
+
 # Test data fixtures
 @pytest.fixture
 def valid_case_data():
@@ -257,9 +340,8 @@ async def create_test_cases(
     count: int = 5
 ) -> list[AuditCase]:
     """Create multiple test cases."""
-    cases = []
-    for i in range(count):
-        case = AuditCase(
+    cases = [
+        AuditCase(
             title=f"Test Case {i+1}",
             description=f"Description for test case {i+1}",
             status="pending" if i % 2 == 0 else "in_progress",
@@ -267,11 +349,12 @@ async def create_test_cases(
             assigned_to_id=user.id,
             patient_id=f"PT{i+1:06d}",
         )
-        session.add(case)
-        cases.append(case)
+        for i in range(count)
+    ]
+    session.add_all(cases)
     
+    # The flush assigns primary keys in place, so no per-case refresh is needed
+    await session.flush()
     await session.commit()
-    for case in cases:
-        await session.refresh(case)
     
-    return cases
\ No newline at end of file
+    return cases
@@ -0,0 +1,77 @@
+"""
+Integration tests for the batch analysis endpoint.
+"""
+import pytest
+from unittest.mock import Mock
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from services.model_manager import get_model_manager
+
+
+def _batch_case(case_id: str, **overrides) -> dict:
+    """A batch entry that passes request and case validation."""
+    case = {
+        "case_id": case_id,
+        "patient_age": 45,
+        "patient_gender": "M",
+        "procedure_code": "40301010",
+        "procedure_description": "Consulta em consultório",
+        "diagnosis_code": "E11.9",
+        "diagnosis_description": "Diabetes mellitus tipo 2",
+        "medical_text": "Paciente com diabetes em acompanhamento",
+        "cost_requested": 150.0
+    }
+    case.update(overrides)
+    return case
+
+
+@pytest.fixture
+async def batch_client():
+    """Client for the service app with the model manager stubbed out."""
+    # No pipeline, so queued batches end right away in the background task
+    model_manager = Mock()
+    model_manager.get_model.return_value = None
+    app.dependency_overrides[get_model_manager] = lambda: model_manager
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.pop(get_model_manager, None)
+
+
+class TestBatchAnalysisValidation:
+    """Test case validation on /analysis/batch."""
+    
+    @pytest.mark.asyncio
+    async def test_invalid_cases_reported_by_case_id(self, batch_client: AsyncClient):
+        """Test that the 400 detail maps each failing case ID to its errors."""
+        # Arrange
+        cases = [
+            _batch_case("CASE-001"),
+            _batch_case("CASE-002", procedure_code="abc-1"),
+            _batch_case("CASE-003", diagnosis_code="E1199")
+        ]
+        
+        # Act
+        response = await batch_client.post("/analysis/batch", json=cases)
+        
+        # Assert
+        assert response.status_code == 400
+        assert response.json()["error"] == {
+            "CASE-002": ["Invalid procedure code format"],
+            "CASE-003": ["Invalid diagnosis code format (ICD)"]
+        }
+    
+    @pytest.mark.asyncio
+    async def test_valid_batch_is_queued(self, batch_client: AsyncClient):
+        """Test that a batch with no validation errors is accepted."""
+        # Act
+        response = await batch_client.post(
+            "/analysis/batch",
+            json=[_batch_case("CASE-001"), _batch_case("CASE-002")]
+        )
+        
+        # Assert
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "queued"
+        assert data["total_cases"] == 2
@@ -0,0 +1,36 @@
+"""
+Unit tests for structured logging configuration.
+"""
+import logging
+import queue
+
+import orjson
+
+from utils.logging_config import InProcessQueueHandler, StructuredFormatter
+
+
+class TestInProcessQueueHandler:
+    """Test records handed to the queue listener."""
+    
+    def test_enqueued_record_keeps_exc_info(self):
+        """Test that the listener's formatter still sees the exception."""
+        # Arrange
+        log_queue = queue.SimpleQueue()
+        test_logger = logging.getLogger("tests.logging_config")
+        test_logger.propagate = False
+        handler = InProcessQueueHandler(log_queue)
+        test_logger.addHandler(handler)
+        
+        # Act
+        try:
+            raise ValueError("bad claim")
+        except ValueError:
+            test_logger.exception("Processing failed for %s", "CASE-001")
+        finally:
+            test_logger.removeHandler(handler)
+        formatted = orjson.loads(StructuredFormatter().format(log_queue.get_nowait()))
+        
+        # Assert
+        assert formatted["message"] == "Processing failed for CASE-001"
+        assert "ValueError: bad claim" in formatted["exc_info"]
+        assert "Traceback" not in formatted["message"]
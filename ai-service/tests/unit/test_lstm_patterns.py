@@ -0,0 +1,69 @@
+"""
+Unit tests for the LSTM treatment pattern model.
+"""
+import pytest
+
+from models.base import ModelInput
+from models.lstm_patterns import LSTMPatternModel
+
+
+@pytest.fixture
+def lstm_model():
+    """Unloaded pattern model with a short sequence window."""
+    return LSTMPatternModel({
+        "name": "LSTM Pattern Analyzer",
+        "sequence_length": 3,
+        "features": ["treatment_patterns", "procedure_sequences"]
+    })
+
+
+def _history_input(treatment_history: list) -> ModelInput:
+    return ModelInput(case_id="CASE-001", data={"treatment_history": treatment_history})
+
+
+class TestExtractSequence:
+    """Test selection of the most recent treatment records."""
+    
+    def test_keeps_most_recent_records_oldest_first(self, lstm_model):
+        """Test that the window holds the latest records in date order."""
+        # Arrange
+        history = [{"date": f"2024-01-0{day}", "id": day} for day in (5, 1, 4, 2, 3)]
+        
+        # Act
+        sequence = lstm_model._extract_sequence(_history_input(history))
+        
+        # Assert
+        assert [record["id"] for record in sequence] == [3, 4, 5]
+    
+    def test_same_date_records_keep_input_order(self, lstm_model):
+        """Test that ties keep the latest entries in input order, like a stable sort."""
+        # Arrange
+        history = [{"date": "2024-01-01", "id": i} for i in range(5)]
+        
+        # Act
+        sequence = lstm_model._extract_sequence(_history_input(history))
+        
+        # Assert
+        assert [record["id"] for record in sequence] == [2, 3, 4]
+        assert sequence == sorted(history, key=lambda record: record["date"])[-3:]
+    
+    def test_empty_history_returns_none(self, lstm_model):
+        """Test that a case without history yields no sequence."""
+        assert lstm_model._extract_sequence(_history_input([])) is None
+
+
+class TestCodeIndex:
+    """Test the code to embedding row mapping."""
+    
+    def test_code_index_is_stable_across_instances(self, lstm_model):
+        """Test that a fresh model maps the same codes to the same rows."""
+        # Arrange
+        other_model = LSTMPatternModel(lstm_model.config)
+        codes = ["40301010", "10101012", "J18.9"]
+        
+        # Act
+        indices = [lstm_model._code_index(code) for code in reversed(codes)][::-1]
+        
+        # Assert
+        assert indices == [other_model._code_index(code) for code in codes]
+        assert all(1 <= index < lstm_model.code_vocab_size for index in indices)
@@ -0,0 +1,187 @@
+"""
+Unit tests for the custom FastAPI middleware.
+"""
+import asyncio
+import time
+import jwt
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+import redis.asyncio as redis
+from fastapi import FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+
+from config.settings import settings
+from utils.middleware import AuthMiddleware, RateLimitMiddleware
+
+
+def _rate_limited_app(**middleware_kwargs) -> FastAPI:
+    """Minimal app with one throttled route and one health route."""
+    app = FastAPI()
+    
+    @app.get("/cases")
+    async def cases():
+        return {"ok": True}
+    
+    @app.get("/health/")
+    async def health():
+        return {"status": "healthy"}
+    
+    app.add_middleware(RateLimitMiddleware, **middleware_kwargs)
+    return app
+
+
+async def _statuses(app: FastAPI, path: str, count: int, headers: dict = None) -> list:
+    """Send ``count`` GET requests and return their status codes."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        return [(await client.get(path, headers=headers)).status_code for _ in range(count)]
+
+
+def _auth_app() -> FastAPI:
+    """Minimal authenticated app whose route tags and echoes the caller's claims."""
+    app = FastAPI()
+    
+    @app.get("/cases")
+    async def cases(request: Request):
+        claims = dict(request.state.user)
+        request.state.user["tagged"] = True
+        return claims
+    
+    app.add_middleware(AuthMiddleware, exclude_paths=["/health"])
+    return app
+
+
+def _bearer(exp: float) -> dict:
+    """Authorization header carrying an HS256 token that expires at ``exp``."""
+    token = jwt.encode({"sub": "auditor-1", "exp": int(exp)}, settings.jwt_secret_key, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestAuthMiddleware:
+    """Test JWT authentication and the verified token cache."""
+    
+    @pytest.mark.asyncio
+    async def test_cached_payload_is_not_shared_between_requests(self):
+        """Test that a handler editing request.state.user leaves the cache intact."""
+        # Arrange
+        app = _auth_app()
+        headers = _bearer(time.time() + 300)
+        
+        # Act
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            first = await client.get("/cases", headers=headers)
+            second = await client.get("/cases", headers=headers)
+        
+        # Assert
+        assert first.status_code == second.status_code == 200
+        assert "tagged" not in second.json()
+        assert second.json()["sub"] == "auditor-1"
+    
+    @pytest.mark.asyncio
+    async def test_cached_token_rejected_after_expiry(self):
+        """Test that a cached token stops being accepted once exp passes."""
+        # Arrange
+        app = _auth_app()
+        headers = _bearer(time.time() + 1)
+        
+        # Act
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            before = await client.get("/cases", headers=headers)
+            await asyncio.sleep(2.1)
+            after = await client.get("/cases", headers=headers)
+        
+        # Assert
+        assert before.status_code == 200
+        assert after.status_code == 401
+    
+    @pytest.mark.asyncio
+    async def test_invalid_token_rejected(self):
+        """Test that a badly signed token gets a 401, before and after a valid one."""
+        # Arrange
+        app = _auth_app()
+        forged = jwt.encode({"sub": "auditor-1", "exp": int(time.time()) + 300}, "wrong-key", algorithm="HS256")
+        
+        # Act
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            rejected = await client.get("/cases", headers={"Authorization": f"Bearer {forged}"})
+            accepted = await client.get("/cases", headers=_bearer(time.time() + 300))
+            rejected_again = await client.get("/cases", headers={"Authorization": f"Bearer {forged}"})
+        
+        # Assert
+        assert rejected.status_code == 401
+        assert accepted.status_code == 200
+        assert rejected_again.status_code == 401
+
+
+class TestRateLimitMiddleware:
+    """Test per-client rate limiting."""
+    
+    @pytest.mark.asyncio
+    async def test_redis_counter_is_shared_between_workers(self, redis_client):
+        """Test that two middleware instances draw on one Redis budget."""
+        # Arrange
+        worker_a = _rate_limited_app(requests_per_minute=2, redis_client=redis_client)
+        worker_b = _rate_limited_app(requests_per_minute=2, redis_client=redis_client)
+        
+        # Act
+        first = await _statuses(worker_a, "/cases", 2)
+        second = await _statuses(worker_b, "/cases", 1)
+        
+        # Assert
+        assert first == [200, 200]
+        assert second == [429]
+    
+    @pytest.mark.asyncio
+    async def test_excluded_paths_are_not_limited(self, redis_client):
+        """Test that health probes never consume the budget."""
+        # Arrange
+        app = _rate_limited_app(requests_per_minute=1, redis_client=redis_client)
+        
+        # Act
+        statuses = await _statuses(app, "/health/", 5)
+        
+        # Assert
+        assert statuses == [200] * 5
+    
+    @pytest.mark.asyncio
+    async def test_clients_are_keyed_by_api_key(self, redis_client):
+        """Test that callers behind one address get separate budgets."""
+        # Arrange
+        app = _rate_limited_app(requests_per_minute=1, redis_client=redis_client)
+        
+        # Act
+        first = await _statuses(app, "/cases", 2, headers={"X-API-Key": "a" * 32})
+        second = await _statuses(app, "/cases", 1, headers={"X-API-Key": "b" * 32})
+        
+        # Assert
+        assert first == [200, 429]
+        assert second == [200]
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_counting_when_redis_fails(self):
+        """Test that Redis errors degrade to per-process counting with one warning."""
+        # Arrange
+        failing_client = Mock()
+        failing_client.register_script.return_value = AsyncMock(
+            side_effect=redis.ConnectionError("connection refused")
+        )
+        app = _rate_limited_app(requests_per_minute=2, redis_client=failing_client)
+        
+        # Act
+        with patch("utils.middleware.logger") as mock_logger:
+            statuses = await _statuses(app, "/cases", 3)
+        
+        # Assert
+        assert statuses == [200, 200, 429]
+        mock_logger.warning.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_counts_locally_without_redis(self):
+        """Test the in-process window when no Redis client is configured."""
+        # Arrange
+        app = _rate_limited_app(requests_per_minute=2)
+        
+        # Act
+        statuses = await _statuses(app, "/cases", 3)
+        
+        # Assert
+        assert statuses == [200, 200, 429]
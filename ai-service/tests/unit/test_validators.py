@@ -0,0 +1,78 @@
+"""
+Unit tests for case data validators.
+"""
+import pytest
+
+from utils.validators import validate_case_data, validate_case_data_batch
+
+
+def _case(**overrides) -> dict:
+    """A case that passes validation, with the given fields replaced."""
+    case = {
+        "patient_age": 45,
+        "patient_gender": "M",
+        "procedure_code": "40301010",
+        "diagnosis_code": "E11.9",
+        "cost_requested": 1500.0,
+        "urgency_level": "routine"
+    }
+    case.update(overrides)
+    return case
+
+
+class TestValidateCaseDataBatch:
+    """Test that batch validation matches per-case validation."""
+    
+    @pytest.mark.parametrize("age", [45, 0, 150, -1, 151, True, False, 45.0, 45.5, None, "45"])
+    @pytest.mark.parametrize("cost", [1500.0, 0, 1500, -0.01, -1, True, None, "1500"])
+    def test_matches_validate_case_data(self, age, cost):
+        """Test ages and costs of every type against the scalar validator."""
+        # Arrange
+        cases = [_case(), _case(patient_age=age, cost_requested=cost), _case(procedure_code="abc")]
+        
+        # Act
+        results = validate_case_data_batch(cases)
+        
+        # Assert
+        assert results == [validate_case_data(case) for case in cases]
+    
+    def test_missing_fields_match_validate_case_data(self):
+        """Test cases without age or cost fields."""
+        # Arrange
+        cases = [{}, {"patient_age": -5}, {"cost_requested": -5}]
+        
+        # Act
+        results = validate_case_data_batch(cases)
+        
+        # Assert
+        assert results == [validate_case_data(case) for case in cases]
+        assert "Invalid patient age" in results[1]
+        assert "Invalid cost requested" in results[2]
+    
+    def test_empty_batch(self):
+        """Test that an empty batch validates to an empty list."""
+        assert validate_case_data_batch([]) == []
+
+
+class TestCodeFormats:
+    """Test procedure and ICD code format checks."""
+    
+    @pytest.mark.parametrize("code", ["40301010", "ABC", "A1B2C3"])
+    def test_valid_procedure_codes(self, code):
+        """Test procedure codes of 3+ uppercase letters or digits."""
+        assert validate_case_data(_case(procedure_code=code)) is None
+    
+    @pytest.mark.parametrize("code", ["AB", "abc", "ABC-1", "ÁBC", "12³", "ABC\n"])
+    def test_invalid_procedure_codes(self, code):
+        """Test that short, lowercase, non-ASCII and newline-terminated codes fail."""
+        assert validate_case_data(_case(procedure_code=code)) == ["Invalid procedure code format"]
+    
+    @pytest.mark.parametrize("code", ["E11", "E11.9", "J18.91"])
+    def test_valid_icd_codes(self, code):
+        """Test ICD codes with zero to two decimal digits."""
+        assert validate_case_data(_case(diagnosis_code=code)) is None
+    
+    @pytest.mark.parametrize("code", ["e11", "E1", "E11.", "E11.999", "E1199", "E¹1", "E11\n", "E11.9\n"])
+    def test_invalid_icd_codes(self, code):
+        """Test malformed ICD codes, including a trailing newline the old '$' anchor let through."""
+        assert validate_case_data(_case(diagnosis_code=code)) == ["Invalid diagnosis code format (ICD)"]
@@ -0,0 +1,79 @@
+"""
+Unit tests for the XGBoost fraud detection model.
+"""
+import pytest
+from unittest.mock import patch
+
+from models.base import ModelInput
+from models.xgboost_fraud import XGBoostFraudModel
+
+
+@pytest.fixture(scope="module")
+async def fraud_model():
+    """Fraud model trained once on the demo data."""
+    model = XGBoostFraudModel({
+        "name": "XGBoost Fraud Detection",
+        "version": "2.1.0",
+        "features": [
+            "provider_claim_frequency",
+            "procedure_code_patterns",
+            "value_anomaly_score",
+            "network_relationship_score",
+            "temporal_pattern_score",
+            "geographic_anomaly_score"
+        ]
+    })
+    await model.load_model()
+    return model
+
+
+@pytest.fixture
+def claim_input():
+    """A claim scored the same way on every call."""
+    return ModelInput(
+        case_id="CASE-001",
+        data={
+            "procedure_code": "40301010",
+            "cost_requested": 4500.0,
+            "provider_info": {"provider_id": "PRV-001"}
+        }
+    )
+
+
+class TestPredictionCache:
+    """Test reuse of predictions for re-scored claims."""
+    
+    @pytest.mark.asyncio
+    async def test_cache_hit_refreshes_processing_time(self, fraud_model, claim_input):
+        """Test that a hit returns the cached scores with its own timing."""
+        # Arrange
+        fraud_model._prediction_cache.clear()
+        miss = await fraud_model.predict(claim_input)
+        
+        # Act
+        with patch("models.xgboost_fraud.time.time", side_effect=[100.0, 100.25]):
+            hit = await fraud_model.predict(claim_input)
+        
+        # Assert
+        assert hit.prediction == miss.prediction
+        assert hit.processing_time_ms == pytest.approx(250.0)
+        assert len(fraud_model._prediction_cache) == 1
+    
+    @pytest.mark.asyncio
+    async def test_mutating_a_prediction_does_not_alter_the_cache(self, fraud_model, claim_input):
+        """Test that edits to returned predictions never reach later hits."""
+        # Arrange
+        fraud_model._prediction_cache.clear()
+        miss = await fraud_model.predict(claim_input)
+        expected = miss.model_copy(deep=True).prediction
+        
+        # Act
+        miss.prediction["risk_level"] = "tampered"
+        miss.prediction["fraud_indicators"].append({"type": "tampered"})
+        first_hit = await fraud_model.predict(claim_input)
+        first_hit.prediction["feature_importance"].clear()
+        second_hit = await fraud_model.predict(claim_input)
+        
+        # Assert
+        assert first_hit.prediction["risk_level"] == expected["risk_level"]
+        assert second_hit.prediction == expected
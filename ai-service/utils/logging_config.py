@@ -1,19 +1,25 @@
 """
 Enhanced Logging Configuration for AI Service
 """
-import json
+import asyncio
+import atexit
+import copy
+import functools
 import logging
 import logging.handlers
 import os
+import queue
+import random
+import re
 import sys
+import threading
 import time
-import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, Optional, Union
 from pathlib import Path
 
 from loguru import logger as loguru_logger
-from pythonjsonlogger import jsonlogger
+import orjson
 import structlog
 
 
@@ -35,34 +41,68 @@ LOG_LEVELS = {
     "CRITICAL": logging.CRITICAL,
 }
 
+# Background thread draining the file log queue (see setup_file_logging)
+_file_log_listener: Optional[logging.handlers.QueueListener] = None
 
-class StructuredFormatter(jsonlogger.JsonFormatter):
-    """Enhanced JSON formatter with service context."""
+# Background Elasticsearch bulk shipper (see setup_elasticsearch_logging)
+_es_shipper: Optional["ElasticsearchBulkShipper"] = None
+
+# (epoch second, formatted second) reused by _iso_timestamp within the same second
+_timestamp_cache = (-1, "")
+
+# Keyword matchers for the security/performance log filters (substring, case-insensitive)
+_SECURITY_RE = re.compile(r"auth|login|permission|access|security|unauthorized", re.IGNORECASE)
+_PERFORMANCE_RE = re.compile(r"performance|latency|response_time|memory|cpu", re.IGNORECASE)
+
+
+def _iso_timestamp(t: Optional[float] = None) -> str:
+    """Format an epoch time as ISO 8601 UTC with milliseconds, e.g. 2024-01-01T12:00:00.123Z."""
+    global _timestamp_cache
+    
+    if t is None:
+        t = time.time()
+    second = int(t)
+    
+    # Read the cache once: the tuple is swapped atomically, so threads never see a torn pair
+    cached_second, formatted = _timestamp_cache
+    if second != cached_second:
+        formatted = datetime.fromtimestamp(second, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        _timestamp_cache = (second, formatted)
+    
+    return f"{formatted}.{int((t - second) * 1000):03d}Z"
+
+
+class StructuredFormatter(logging.Formatter):
+    """Enhanced JSON formatter with service context, serialized with orjson."""
+    
+    # Attributes every LogRecord has; anything else on a record is caller context
+    _RESERVED_ATTRS = frozenset(
+        vars(logging.LogRecord("", 0, "", 0, "", (), None))
+    ) | {"message", "asctime"}
     
-    def add_fields(self, log_record: Dict[str, Any], record: logging.LogRecord, message_dict: Dict[str, Any]) -> None:
-        super().add_fields(log_record, record, message_dict)
+    def format(self, record: logging.LogRecord) -> str:
+        log_record: Dict[str, Any] = {"message": record.getMessage()}
+        
+        # Add context passed via extra/log_with_context (trace_id, span_id,
+        # request_id, user_id, duration, memory_usage, ...)
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED_ATTRS:
+                log_record[key] = value
+        
+        if record.exc_info:
+            log_record["exc_info"] = self.formatException(record.exc_info)
         
         # Add service information
         log_record.update(SERVICE_INFO)
         
-        # Standardize timestamp
-        log_record["@timestamp"] = datetime.utcnow().isoformat() + "Z"
+        # Standardize timestamp on the record's creation time
+        log_record["@timestamp"] = _iso_timestamp(record.created)
         
-        # Add trace information if available
-        if hasattr(record, 'trace_id'):
-            log_record["trace_id"] = record.trace_id
-        if hasattr(record, 'span_id'):
-            log_record["span_id"] = record.span_id
-        if hasattr(record, 'request_id'):
-            log_record["request_id"] = record.request_id
-        if hasattr(record, 'user_id'):
-            log_record["user_id"] = record.user_id
-            
-        # Add performance metrics if available
-        if hasattr(record, 'duration'):
-            log_record["duration"] = record.duration
-        if hasattr(record, 'memory_usage'):
-            log_record["memory_usage"] = record.memory_usage
+        return orjson.dumps(
+            log_record,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS
+        ).decode()
 
 
 class SecurityLogFilter(logging.Filter):
@@ -70,8 +110,7 @@ class SecurityLogFilter(logging.Filter):
     
     def filter(self, record: logging.LogRecord) -> bool:
         # Mark security events
-        security_keywords = ['auth', 'login', 'permission', 'access', 'security', 'unauthorized']
-        if any(keyword in record.getMessage().lower() for keyword in security_keywords):
+        if _SECURITY_RE.search(record.getMessage()):
             record.security_event = True
         return True
 
@@ -81,14 +120,33 @@ class PerformanceLogFilter(logging.Filter):
     
     def filter(self, record: logging.LogRecord) -> bool:
         # Mark performance events
-        performance_keywords = ['performance', 'latency', 'response_time', 'memory', 'cpu']
-        if any(keyword in record.getMessage().lower() for keyword in performance_keywords):
+        if _PERFORMANCE_RE.search(record.getMessage()):
             record.performance_event = True
         return True
 
 
+class InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for queues drained by a thread in this process.
+    
+    The stock prepare() drops exc_info so records can be pickled, which leaves
+    the listener's formatters without the exception to render.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message like the stock handler, but keep exc_info
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
 def setup_file_logging(log_dir: str = "logs") -> None:
-    """Setup file-based logging with rotation."""
+    """Setup file-based logging with rotation.
+    
+    File handlers run on a QueueListener thread; callers only enqueue records.
+    """
+    global _file_log_listener
     
     # Ensure log directory exists
     Path(log_dir).mkdir(parents=True, exist_ok=True)
@@ -121,7 +179,6 @@ def setup_file_logging(log_dir: str = "logs") -> None:
     )
     app_handler.setFormatter(StructuredFormatter())
     app_handler.addFilter(logging.Filter(lambda record: record.levelno >= logging.INFO))
-    root_logger.addHandler(app_handler)
     
     # Error logs with daily rotation
     error_handler = logging.handlers.TimedRotatingFileHandler(
@@ -133,7 +190,6 @@ def setup_file_logging(log_dir: str = "logs") -> None:
     )
     error_handler.setFormatter(StructuredFormatter())
     error_handler.addFilter(logging.Filter(lambda record: record.levelno >= logging.ERROR))
-    root_logger.addHandler(error_handler)
     
     # Security logs with extended retention
     security_handler = logging.handlers.TimedRotatingFileHandler(
@@ -145,7 +201,6 @@ def setup_file_logging(log_dir: str = "logs") -> None:
     )
     security_handler.setFormatter(StructuredFormatter())
     security_handler.addFilter(SecurityLogFilter())
-    root_logger.addHandler(security_handler)
     
     # Performance logs
     performance_handler = logging.handlers.TimedRotatingFileHandler(
@@ -157,11 +212,92 @@ def setup_file_logging(log_dir: str = "logs") -> None:
     )
     performance_handler.setFormatter(StructuredFormatter())
     performance_handler.addFilter(PerformanceLogFilter())
-    root_logger.addHandler(performance_handler)
+    
+    # Route file handlers through a queue so disk I/O never blocks the caller
+    stop_file_logging()
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(InProcessQueueHandler(log_queue))
+    _file_log_listener = logging.handlers.QueueListener(
+        log_queue,
+        app_handler,
+        error_handler,
+        security_handler,
+        performance_handler,
+        respect_handler_level=True
+    )
+    _file_log_listener.start()
+    atexit.register(stop_file_logging)
+
+
+def stop_file_logging() -> None:
+    """Flush and stop the file logging listener thread, if running."""
+    global _file_log_listener
+    
+    if _file_log_listener is not None:
+        _file_log_listener.stop()
+        _file_log_listener = None
+
+
+class ElasticsearchBulkShipper(threading.Thread):
+    """Drain queued log records to Elasticsearch in bulk from a background thread."""
+    
+    _STOP = object()
+    
+    def __init__(self, es_client, index_name: str, formatter: logging.Formatter,
+                 batch_size: int = 500, flush_interval: float = 0.5):
+        super().__init__(name="es-log-shipper", daemon=True)
+        self.queue = queue.SimpleQueue()
+        self.es_client = es_client
+        self.index_name = index_name
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+    
+    def run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopped = False
+        
+        while not stopped:
+            try:
+                record = self.queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                if record is self._STOP:
+                    stopped = True
+                else:
+                    batch.append(self.formatter.format(record))
+            except queue.Empty:
+                pass
+            
+            # Flush on size, on the interval, and once more when stopping
+            if stopped or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+    
+    def _flush(self, batch: list) -> None:
+        from elasticsearch.helpers import bulk
+        
+        try:
+            # Documents are already ECS JSON strings, sent as-is
+            bulk(self.es_client, batch, index=self.index_name, raise_on_error=False)
+        except Exception as e:
+            # Logging here would feed the failure back into this queue
+            sys.stderr.write(f"Failed to ship {len(batch)} log records to Elasticsearch: {e}\n")
+    
+    def stop(self) -> None:
+        """Flush pending records and stop the thread."""
+        self.queue.put(self._STOP)
+        self.join(timeout=5)
 
 
 def setup_elasticsearch_logging() -> None:
-    """Setup Elasticsearch logging for production."""
+    """Setup Elasticsearch logging for production.
+    
+    Records are enqueued on the root logger and shipped in bulk by
+    ElasticsearchBulkShipper, so no log call waits on an HTTP round-trip.
+    """
+    global _es_shipper
     
     if os.getenv("ENVIRONMENT") != "production" or not os.getenv("ELASTICSEARCH_URL"):
         return
@@ -169,7 +305,6 @@ def setup_elasticsearch_logging() -> None:
     try:
         from elasticsearch import Elasticsearch
         from ecs_logging import StdlibFormatter
-        from ecs_logging.handlers import ElasticsearchHandler
         
         # Create Elasticsearch client
         es_client = Elasticsearch(
@@ -181,15 +316,21 @@ def setup_elasticsearch_logging() -> None:
             verify_certs=False
         )
         
-        # Create Elasticsearch handler
-        es_handler = ElasticsearchHandler(
-            es_client=es_client,
+        # Start the bulk shipper
+        if _es_shipper is not None:
+            _es_shipper.stop()
+        _es_shipper = ElasticsearchBulkShipper(
+            es_client,
             index_name="austa-ai-service-logs",
-            doc_type="_doc"
+            formatter=StdlibFormatter()
         )
-        es_handler.setFormatter(StdlibFormatter())
+        _es_shipper.start()
+        atexit.register(_es_shipper.stop)
         
-        # Add to root logger
+        # Enqueue from the root logger, skipping the Elasticsearch client's own
+        # records so shipping a batch never produces more records to ship
+        es_handler = InProcessQueueHandler(_es_shipper.queue)
+        es_handler.addFilter(lambda record: not record.name.startswith("elastic"))
         logging.getLogger().addHandler(es_handler)
         
     except ImportError:
@@ -204,33 +345,26 @@ def configure_loguru() -> None:
     # Remove default handler
     loguru_logger.remove()
     
-    # Console handler
-    log_format = (
-        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
-        "<level>{level: <8}</level> | "
-        "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
-        "<level>{message}</level>"
-    )
+    # Service information rides on every record's extra instead of each format string
+    loguru_logger.configure(extra=SERVICE_INFO)
     
-    if os.getenv("ENVIRONMENT") == "production":
-        log_format = json.dumps({
-            "@timestamp": "{time:YYYY-MM-DD HH:mm:ss.SSSZ}",
-            "level": "{level}",
-            "logger": "{name}",
-            "function": "{function}",
-            "line": "{line}",
-            "message": "{message}",
-            **SERVICE_INFO
-        })
+    production = os.getenv("ENVIRONMENT") == "production"
     
+    # Console handler; production emits Loguru's own JSON serialization
     loguru_logger.add(
         sys.stdout,
-        format=log_format,
+        format=(
+            "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+            "<level>{level: <8}</level> | "
+            "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
+            "<level>{message}</level>"
+        ),
         level=os.getenv("LOG_LEVEL", "INFO"),
-        colorize=os.getenv("ENVIRONMENT") != "production"
+        colorize=not production,
+        serialize=production
     )
     
-    # File handlers
+    # File handlers; enqueue moves disk writes to Loguru's writer thread
     if os.getenv("ENVIRONMENT") != "test":
         log_dir = Path("logs")
         log_dir.mkdir(exist_ok=True)
@@ -238,16 +372,9 @@ def configure_loguru() -> None:
         # Application logs
         loguru_logger.add(
             log_dir / "application.log",
-            format=json.dumps({
-                "@timestamp": "{time:YYYY-MM-DD HH:mm:ss.SSSZ}",
-                "level": "{level}",
-                "logger": "{name}",
-                "function": "{function}",
-                "line": "{line}",
-                "message": "{message}",
-                **SERVICE_INFO
-            }),
             level="INFO",
+            serialize=True,
+            enqueue=True,
             rotation="1 day",
             retention="30 days",
             compression="gz"
@@ -256,17 +383,9 @@ def configure_loguru() -> None:
         # Error logs
         loguru_logger.add(
             log_dir / "error.log",
-            format=json.dumps({
-                "@timestamp": "{time:YYYY-MM-DD HH:mm:ss.SSSZ}",
-                "level": "{level}",
-                "logger": "{name}",
-                "function": "{function}",
-                "line": "{line}",
-                "message": "{message}",
-                "stack": "{exception}",
-                **SERVICE_INFO
-            }),
             level="ERROR",
+            serialize=True,
+            enqueue=True,
             rotation="1 day",
             retention="90 days",
             compression="gz"
@@ -315,7 +434,7 @@ def log_security_event(event: str, **details: Any) -> None:
         event_type="security",
         event=event,
         severity="high",
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=_iso_timestamp(),
         **details
     )
 
@@ -331,7 +450,7 @@ def log_audit_event(action: str, user_id: str, resource: str, **details: Any) ->
         action=action,
         user_id=user_id,
         resource=resource,
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=_iso_timestamp(),
         **details
     )
 
@@ -347,7 +466,7 @@ def log_performance_metric(metric: str, value: float, **context: Any) -> None:
         metric=metric,
         value=value,
         unit=context.get("unit", "ms"),
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=_iso_timestamp(),
         **context
     )
 
@@ -361,19 +480,31 @@ def log_business_event(event: str, **data: Any) -> None:
         f"Business: {event}",
         event_type="business",
         event=event,
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=_iso_timestamp(),
         **data
     )
 
 
+# Trace/span IDs come from a per-process PRNG seeded from the OS once, so the
+# per-request path makes no getrandom syscall. Forked workers reseed so they
+# never replay the parent's sequence.
+_id_rng = random.Random(os.urandom(16))
+os.register_at_fork(after_in_child=lambda: _id_rng.seed(os.urandom(16)))
+
+
 def generate_trace_id() -> str:
-    """Generate a unique trace ID."""
-    return str(uuid.uuid4())
+    """Generate a unique trace ID (128 bits, 32 hex chars, W3C trace-id sized)."""
+    return f"{_id_rng.getrandbits(128):032x}"
+
+
+def generate_span_id() -> str:
+    """Generate a unique span ID (64 bits, 16 hex chars, W3C span-id sized)."""
+    return f"{_id_rng.getrandbits(64):016x}"
 
 
 def generate_request_id() -> str:
     """Generate a unique request ID."""
-    return str(uuid.uuid4())
+    return os.urandom(16).hex()
 
 
 class LogContext:
@@ -399,36 +530,53 @@ class LogContext:
 
 # Performance monitoring decorator
 def log_performance(func_name: Optional[str] = None):
-    """Decorator to log function performance."""
+    """Decorator to log function performance; awaits coroutine functions."""
     def decorator(func):
-        def wrapper(*args, **kwargs):
-            start_time = time.time()
-            func_name_actual = func_name or func.__name__
+        func_name_actual = func_name or func.__name__
+        metric = f"function_execution_{func_name_actual}"
+        
+        def record(start_ns: int, error: Optional[Exception] = None):
+            duration = (time.perf_counter_ns() - start_ns) / 1e6  # Convert to milliseconds
             
-            try:
-                result = func(*args, **kwargs)
-                duration = (time.time() - start_time) * 1000  # Convert to milliseconds
-                
+            if error is None:
+                log_performance_metric(metric, duration, function=func_name_actual, success=True)
+            else:
                 log_performance_metric(
-                    f"function_execution_{func_name_actual}",
+                    metric,
                     duration,
                     function=func_name_actual,
-                    success=True
+                    success=False,
+                    error=str(error)
                 )
+        
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_ns = time.perf_counter_ns()
                 
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    record(start_ns, e)
+                    raise
+                
+                record(start_ns)
                 return result
+            
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            
+            try:
+                result = func(*args, **kwargs)
             except Exception as e:
-                duration = (time.time() - start_time) * 1000
-                
-                log_performance_metric(
-                    f"function_execution_{func_name_actual}",
-                    duration,
-                    function=func_name_actual,
-                    success=False,
-                    error=str(e)
-                )
-                
+                record(start_ns, e)
                 raise
+            
+            record(start_ns)
+            return result
         
         return wrapper
     return decorator
@@ -5,8 +5,11 @@ from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
+from collections import OrderedDict
+import hashlib
 import time
 import jwt
+import redis.asyncio as redis
 from typing import Optional
 from loguru import logger
 
@@ -17,11 +20,11 @@ class TimingMiddleware(BaseHTTPMiddleware):
     """Add request timing headers."""
     
     async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         response = await call_next(request)
         
-        process_time = time.time() - start_time
+        process_time = (time.perf_counter_ns() - start_ns) / 1e9
         response.headers["X-Process-Time"] = str(process_time)
         
         # Log slow requests
@@ -37,13 +40,19 @@ class TimingMiddleware(BaseHTTPMiddleware):
 class AuthMiddleware(BaseHTTPMiddleware):
     """Handle authentication."""
     
-    def __init__(self, app, exclude_paths: Optional[list] = None):
+    def __init__(self, app, exclude_paths: Optional[list] = None, token_cache_size: int = 4096):
         super().__init__(app)
         self.exclude_paths = exclude_paths or ["/", "/health", "/docs", "/openapi.json"]
+        # str.startswith takes a tuple and checks every prefix in C
+        self._exclude_prefixes = tuple(self.exclude_paths)
+        self._jwt_key = settings.jwt_secret_key.encode()
+        # Token digest -> (payload, expires_at); verified tokens skip jwt.decode until exp
+        self._jwt_cache = OrderedDict()
+        self._jwt_cache_size = token_cache_size
     
     async def dispatch(self, request: Request, call_next):
         # Skip auth for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
+        if request.url.path.startswith(self._exclude_prefixes):
             return await call_next(request)
         
         # Check for API key or JWT token
@@ -60,19 +69,14 @@ class AuthMiddleware(BaseHTTPMiddleware):
         elif auth_header:
             # Validate JWT token
             try:
-                scheme, token = auth_header.split()
+                scheme, token = auth_header.split(None, 1)
                 if scheme.lower() != "bearer":
                     return Response(
                         content="Invalid authentication scheme",
                         status_code=401
                     )
                 
-                payload = jwt.decode(
-                    token,
-                    settings.jwt_secret_key,
-                    algorithms=["HS256"]
-                )
-                request.state.user = payload
+                request.state.user = self._decode_token(token)
             except (ValueError, jwt.InvalidTokenError) as e:
                 return Response(
                     content="Invalid token",
@@ -88,55 +92,131 @@ class AuthMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
     
+    def _decode_token(self, token: str) -> dict:
+        """Decode a JWT, reusing the payload of a recently verified identical token."""
+        digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        now = time.time()
+        
+        # Callers get their own copy so request.state.user edits never reach the cache
+        cached = self._jwt_cache.get(digest)
+        if cached is not None and cached[1] > now:
+            self._jwt_cache.move_to_end(digest)
+            return dict(cached[0])
+        
+        payload = jwt.decode(token, self._jwt_key, algorithms=["HS256"])
+        
+        # Tokens without exp are re-verified after a minute
+        self._jwt_cache[digest] = (payload, payload.get("exp", now + 60))
+        self._jwt_cache.move_to_end(digest)
+        if len(self._jwt_cache) > self._jwt_cache_size:
+            self._jwt_cache.popitem(last=False)
+        
+        return dict(payload)
+    
     def _validate_api_key(self, api_key: str) -> bool:
         """Validate API key (simplified)."""
         # In production, check against database or secure storage
         return len(api_key) == 32  # Simple length check for demo
 
 
+# Atomic fixed-window counter: the first hit in a window sets its expiry
+_RATE_LIMIT_SCRIPT = """
+local n = redis.call('INCR', KEYS[1])
+if n == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return n
+"""
+
+# Minimum seconds between warnings about falling back to local counting
+_REDIS_WARNING_INTERVAL = 60
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware."""
+    """Rate limiting middleware.
+    
+    Clients are keyed by the principal AuthMiddleware authenticated, falling
+    back to the peer address. With a Redis client, counters are shared by all
+    workers; otherwise each process counts on its own. Without an explicit
+    client, the one stored on ``app.state.redis_client`` at startup is used.
+    """
     
-    def __init__(self, app, requests_per_minute: int = 60):
+    def __init__(self, app, requests_per_minute: int = 60, max_clients: int = 10_000,
+                 redis_client: Optional[redis.Redis] = None, exclude_paths: Optional[list] = None):
         super().__init__(app)
+        self.exclude_paths = exclude_paths or ["/health", "/metrics", "/docs", "/redoc", "/openapi.json"]
+        self._exclude_prefixes = tuple(self.exclude_paths)
         self.requests_per_minute = requests_per_minute
-        self.request_counts = {}
+        self.max_clients = max_clients
+        # client_id -> [minute_window, count], least recently seen first
+        self.request_counts = OrderedDict()
+        self._rate_script = redis_client.register_script(_RATE_LIMIT_SCRIPT) if redis_client else None
+        self._last_redis_warning = float("-inf")
     
     async def dispatch(self, request: Request, call_next):
-        # Get client identifier (IP or user ID)
-        client_id = request.client.host if request.client else "unknown"
+        # Probes, scrapes and docs are never throttled; the root path is matched
+        # exactly because every path starts with "/"
+        path = request.url.path
+        if path == "/" or path.startswith(self._exclude_prefixes):
+            return await call_next(request)
         
-        # Check rate limit
-        current_time = time.time()
-        minute_window = int(current_time // 60)
+        client_id = self._client_id(request)
         
-        key = f"{client_id}:{minute_window}"
+        # Check rate limit
+        minute_window = int(time.time() // 60)
         
-        if key not in self.request_counts:
-            self.request_counts[key] = 0
+        if self._rate_script is None:
+            # The shared client only exists once the app's lifespan has started
+            redis_client = getattr(request.app.state, "redis_client", None)
+            if redis_client is not None:
+                self._rate_script = redis_client.register_script(_RATE_LIMIT_SCRIPT)
         
-        self.request_counts[key] += 1
+        if self._rate_script is not None:
+            try:
+                count = await self._rate_script(keys=[f"rl:{client_id}:{minute_window}"], args=[60])
+            except redis.RedisError as e:
+                # Fail over to per-process counting rather than rejecting traffic
+                now = time.monotonic()
+                if now - self._last_redis_warning >= _REDIS_WARNING_INTERVAL:
+                    self._last_redis_warning = now
+                    logger.warning(f"Redis rate limiting unavailable, counting locally: {e}")
+                count = self._count_locally(client_id, minute_window)
+        else:
+            count = self._count_locally(client_id, minute_window)
         
-        if self.request_counts[key] > self.requests_per_minute:
+        if count > self.requests_per_minute:
             return Response(
                 content="Rate limit exceeded",
                 status_code=429,
                 headers={"Retry-After": "60"}
             )
         
-        # Clean old entries
-        self._cleanup_old_entries(minute_window)
-        
         response = await call_next(request)
         return response
     
-    def _cleanup_old_entries(self, current_window: int):
-        """Remove entries older than 2 minutes."""
-        keys_to_remove = []
-        for key in self.request_counts:
-            window = int(key.split(":")[1])
-            if window < current_window - 2:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.request_counts[key]
\ No newline at end of file
+    def _client_id(self, request: Request) -> str:
+        """Identify the caller by JWT subject, API key digest or peer address."""
+        user = getattr(request.state, "user", None)
+        if user and user.get("sub"):
+            return f"user:{user['sub']}"
+        
+        api_key = request.headers.get("X-API-Key")
+        if api_key:
+            return f"key:{hashlib.blake2b(api_key.encode(), digest_size=16).hexdigest()}"
+        
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+    
+    def _count_locally(self, client_id: str, minute_window: int) -> int:
+        """Count a request in the in-process window table and return the window's total."""
+        entry = self.request_counts.get(client_id)
+        if entry is None or entry[0] != minute_window:
+            entry = self.request_counts[client_id] = [minute_window, 1]
+            
+            # Evict the least recently seen client instead of sweeping old windows
+            if len(self.request_counts) > self.max_clients:
+                self.request_counts.popitem(last=False)
+        else:
+            entry[1] += 1
+        self.request_counts.move_to_end(client_id)
+        
+        return entry[1]
\ No newline at end of file
@@ -3,44 +3,83 @@ Distributed Tracing Configuration for AUSTA AI Service
 Implements OpenTelemetry-based distributed tracing for request correlation
 """
 import os
+import threading
 import time
-import uuid
 from typing import Dict, Any, Optional, Callable
 from contextlib import contextmanager
 
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentation
-from opentelemetry.instrumentation.requests import RequestsInstrumentation
-from opentelemetry.instrumentation.psycopg2 import Psycopg2Instrumentation
-from opentelemetry.instrumentation.redis import RedisInstrumentation
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.instrumentation.requests import RequestsInstrumentor
+from opentelemetry.instrumentation.psycopg2 import Psycopg2Instrumentor
+from opentelemetry.instrumentation.redis import RedisInstrumentor
 from opentelemetry.trace import Status, StatusCode, SpanKind
 from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
 
 import logging
-from fastapi import Request, Response
+from fastapi import FastAPI, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from utils.logging_config import log_with_context, log_performance_metric
+from utils.logging_config import (
+    log_with_context,
+    log_performance_metric,
+    generate_trace_id,
+    generate_span_id
+)
 
 # Service configuration
 SERVICE_NAME = "austa-ai-service"
 SERVICE_VERSION = os.getenv("SERVICE_VERSION", "1.0.0")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
-# Global tracer instance
+# Global tracer instance, set by initialize_tracing()
 tracer: Optional[trace.Tracer] = None
+_tracer_lock = threading.Lock()
+
+# Used until initialize_tracing() runs; its spans are non-recording
+_noop_tracer = trace.NoOpTracer()
 propagator = TraceContextTextMapPropagator()
 
 logger = logging.getLogger(__name__)
 
+# Log 1 in N requests' access line and latency metric; failures always log
+_LOG_SAMPLE_RATE = max(int(os.getenv("TRACING_LOG_SAMPLE_RATE", "1")), 1)
+
+# Per-request latency metrics; METRICS_ENABLED=0 reduces them to one branch
+_METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+_HTTP_METRIC_NAMES = {
+    method: f"http_request_{method.lower()}"
+    for method in ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+}
+
 
 def initialize_tracing() -> None:
-    """Initialize OpenTelemetry tracing for the AI service."""
+    """Initialize OpenTelemetry tracing for the AI service; later calls are no-ops."""
+    with _tracer_lock:
+        if tracer is not None:
+            return
+        _setup_tracer_provider()
+
+
+def instrument_app(app: FastAPI) -> None:
+    """Add OpenTelemetry's ASGI middleware to the app.
+    
+    Must run before the app starts (middleware cannot be added afterwards).
+    The middleware's proxy tracer stays a no-op until initialize_tracing()
+    installs the tracer provider.
+    """
+    FastAPIInstrumentor.instrument_app(app)
+
+
+def _setup_tracer_provider() -> None:
+    """Configure the tracer provider, exporters and library instrumentation."""
     global tracer
     
     # Create resource with service information
@@ -51,8 +90,17 @@ def initialize_tracing() -> None:
         ResourceAttributes.SERVICE_NAMESPACE: "austa",
     })
     
-    # Create tracer provider
-    provider = TracerProvider(resource=resource)
+    # Create tracer provider. Head sampling keeps a fraction of new traces
+    # (everything in development); unsampled spans are no-op NonRecordingSpans,
+    # and spans with an upstream parent follow the parent's decision.
+    sample_ratio = float(os.getenv(
+        "TRACE_SAMPLE_RATIO",
+        "1.0" if ENVIRONMENT == "development" else "0.1"
+    ))
+    provider = TracerProvider(
+        resource=resource,
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio))
+    )
     
     # Configure exporters
     exporters = []
@@ -70,12 +118,22 @@ def initialize_tracing() -> None:
             collector_endpoint=jaeger_endpoint,
             username=os.getenv("JAEGER_USERNAME"),
             password=os.getenv("JAEGER_PASSWORD"),
+            # Larger batches below would overflow a single UDP packet to the agent
+            udp_split_oversized_batches=True,
         )
         exporters.append(jaeger_exporter)
     
-    # Add batch span processors
+    # Add batch span processors. Bigger, less frequent batches amortize
+    # serialization and export I/O and cut queue lock wakeups, at the cost of
+    # spans reaching the backend up to schedule_delay later.
     for exporter in exporters:
-        processor = BatchSpanProcessor(exporter)
+        processor = BatchSpanProcessor(
+            exporter,
+            max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "8192")),
+            max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "1024")),
+            schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "5000")),
+            export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "30000")),
+        )
         provider.add_span_processor(processor)
     
     # Set the tracer provider
@@ -84,11 +142,10 @@ def initialize_tracing() -> None:
     # Get tracer instance
     tracer = trace.get_tracer(SERVICE_NAME, SERVICE_VERSION)
     
-    # Instrument libraries
-    FastAPIInstrumentation.instrument()
-    RequestsInstrumentation.instrument()
-    Psycopg2Instrumentation.instrument()
-    RedisInstrumentation.instrument()
+    # Instrument libraries (the FastAPI app itself is done by instrument_app)
+    RequestsInstrumentor().instrument()
+    Psycopg2Instrumentor().instrument()
+    RedisInstrumentor().instrument()
     
     logger.info(
         "Distributed tracing initialized",
@@ -101,84 +158,98 @@ def initialize_tracing() -> None:
     )
 
 
+def _get_tracer() -> trace.Tracer:
+    """Return the tracer, or a no-op tracer until initialize_tracing() has run."""
+    return tracer or _noop_tracer
+
+
 class TracingMiddleware(BaseHTTPMiddleware):
     """FastAPI middleware for distributed tracing."""
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        # Read request fields once; each URL/header access does its own lookup
+        url = request.url
+        url_str = str(url)
+        path = url.path
+        method = request.method
+        user_agent = request.headers.get("user-agent", "")
+        
         # Extract or generate trace ID
         trace_id = (
             request.headers.get("x-trace-id") or
             request.headers.get("traceparent") or
-            str(uuid.uuid4())
+            generate_trace_id()
         )
         
         # Generate span ID
-        span_id = str(uuid.uuid4())
+        span_id = generate_span_id()
         
         # Store tracing information in request state
         request.state.trace_id = trace_id
         request.state.span_id = span_id
         
-        # Extract trace context from headers
-        headers = dict(request.headers)
-        ctx = propagator.extract(headers)
+        # Extract trace context from headers (Headers is already a mapping)
+        ctx = propagator.extract(request.headers)
         
         # Create span for the request
-        with tracer.start_as_current_span(
-            f"{request.method} {request.url.path}",
+        with _get_tracer().start_as_current_span(
+            f"{method} {path}",
             context=ctx,
             kind=SpanKind.SERVER,
         ) as span:
             
-            # Set span attributes
-            span.set_attributes({
-                "http.method": request.method,
-                "http.url": str(request.url),
-                "http.scheme": request.url.scheme,
-                "http.host": request.url.hostname,
-                "http.user_agent": request.headers.get("user-agent", ""),
-                "http.request_content_length": request.headers.get("content-length"),
-                "trace.id": trace_id,
-                "span.id": span_id,
-            })
+            # Collect span attributes, only if the span is sampled; they are
+            # set in a single call once the request completes. The dict lives
+            # across call_next, so it is per request rather than shared.
+            recording = span.is_recording()
+            if recording:
+                attrs = {
+                    "http.method": method,
+                    "http.url": url_str,
+                    "http.scheme": url.scheme,
+                    "http.host": url.hostname,
+                    "http.user_agent": user_agent,
+                    "http.request_content_length": request.headers.get("content-length"),
+                    "trace.id": trace_id,
+                    "span.id": span_id,
+                }
             
             # Store span in request state
             request.state.span = span
             
-            # Log request with tracing context
-            log_with_context(
-                logger,
-                "INFO",
-                "HTTP Request received",
-                trace_id=trace_id,
-                span_id=span_id,
-                method=request.method,
-                url=str(request.url),
-                user_agent=request.headers.get("user-agent", ""),
-                ip=request.client.host if request.client else None,
-            )
+            # Span context cached for downstream calls; W3C traceparent for
+            # outgoing calls, formatted once per request
+            span_context = request.state.span_context = span.get_span_context()
+            if span_context.is_valid:
+                request.state.traceparent = (
+                    f"00-{span_context.trace_id:032x}-{span_context.span_id:016x}"
+                    f"-{span_context.trace_flags:02x}"
+                )
+            
+            # Sampled per trace so the log line and metric cover the same requests
+            log_sampled = _LOG_SAMPLE_RATE == 1 or hash(trace_id) % _LOG_SAMPLE_RATE == 0
             
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             
             try:
                 # Process request
                 response = await call_next(request)
                 
                 # Calculate duration
-                duration = (time.time() - start_time) * 1000  # Convert to milliseconds
+                duration = (time.perf_counter_ns() - start_ns) / 1e6  # Convert to milliseconds
                 
                 # Update span with response information
-                span.set_attributes({
-                    "http.status_code": response.status_code,
-                    "http.response_content_length": response.headers.get("content-length"),
-                    "http.duration": duration,
-                })
-                
-                # Set span status
-                if response.status_code >= 400:
-                    span.set_status(Status(StatusCode.ERROR, f"HTTP {response.status_code}"))
-                else:
-                    span.set_status(Status(StatusCode.OK))
+                if recording:
+                    attrs["http.status_code"] = response.status_code
+                    attrs["http.response_content_length"] = response.headers.get("content-length")
+                    attrs["http.duration"] = duration
+                    span.set_attributes(attrs)
+                    
+                    # Set span status
+                    if response.status_code >= 400:
+                        span.set_status(Status(StatusCode.ERROR, f"HTTP {response.status_code}"))
+                    else:
+                        span.set_status(Status(StatusCode.OK))
                 
                 # Add tracing headers to response
                 response.headers["X-Trace-ID"] = trace_id
@@ -187,49 +258,47 @@ class TracingMiddleware(BaseHTTPMiddleware):
                 # Inject trace context into response headers
                 propagator.inject(response.headers)
                 
-                # Log response with tracing context
-                log_with_context(
-                    logger,
-                    "INFO",
-                    "HTTP Response sent",
-                    trace_id=trace_id,
-                    span_id=span_id,
-                    status_code=response.status_code,
-                    duration=duration,
-                )
-                
-                # Log performance metric
-                log_performance_metric(
-                    f"http_request_{request.method.lower()}",
-                    duration,
-                    trace_id=trace_id,
-                    endpoint=request.url.path,
-                    status_code=response.status_code,
-                )
+                if log_sampled:
+                    # One structured line per request; the span marks its start
+                    log_with_context(
+                        logger,
+                        "INFO",
+                        "HTTP Response sent",
+                        trace_id=trace_id,
+                        span_id=span_id,
+                        method=method,
+                        url=url_str,
+                        user_agent=user_agent,
+                        ip=request.client.host if request.client else None,
+                        status_code=response.status_code,
+                        duration=duration,
+                    )
+                    
+                    # Log performance metric
+                    if _METRICS_ENABLED:
+                        log_performance_metric(
+                            _HTTP_METRIC_NAMES.get(method) or f"http_request_{method.lower()}",
+                            duration,
+                            trace_id=trace_id,
+                            endpoint=path,
+                            status_code=response.status_code,
+                        )
                 
                 return response
                 
             except Exception as e:
                 # Handle errors
-                duration = (time.time() - start_time) * 1000
-                
-                span.set_attributes({
-                    "http.duration": duration,
-                    "error.message": str(e),
-                    "error.type": type(e).__name__,
-                })
+                duration = (time.perf_counter_ns() - start_ns) / 1e6
                 
-                span.set_status(Status(StatusCode.ERROR, str(e)))
+                if recording:
+                    attrs["http.duration"] = duration
+                    attrs["error.message"] = str(e)
+                    attrs["error.type"] = type(e).__name__
+                    span.set_attributes(attrs)
+                    span.set_status(Status(StatusCode.ERROR, str(e)))
                 
-                logger.error(
-                    f"Request failed: {e}",
-                    extra={
-                        "trace_id": trace_id,
-                        "span_id": span_id,
-                        "error_type": type(e).__name__,
-                        "duration": duration,
-                    }
-                )
+                # Error details are on the span; keep the trace ID for correlation
+                logger.error("Request failed (trace %s): %s", trace_id, e, exc_info=True)
                 
                 raise
 
@@ -244,10 +313,7 @@ def create_child_span(
         logger.warning(f"No parent span found in request for operation: {operation_name}")
         return None
     
-    if not tracer:
-        return None
-    
-    span = tracer.start_span(
+    span = _get_tracer().start_span(
         operation_name,
         attributes={
             **(attributes or {}),
@@ -267,11 +333,10 @@ def get_trace_headers(request: Request) -> Dict[str, str]:
         headers["X-Trace-ID"] = request.state.trace_id
         headers["X-Parent-Span-ID"] = request.state.span_id
     
-    # Add W3C Trace Context header
-    if hasattr(request.state, "span"):
-        span_context = request.state.span.get_span_context()
-        if span_context.trace_id and span_context.span_id:
-            headers["traceparent"] = f"00-{span_context.trace_id:032x}-{span_context.span_id:016x}-01"
+    # Add W3C Trace Context header (precomputed by TracingMiddleware)
+    traceparent = getattr(request.state, "traceparent", None)
+    if traceparent:
+        headers["traceparent"] = traceparent
     
     return headers
 
@@ -284,26 +349,28 @@ def instrument_model_operation(
     input_data: Optional[Dict[str, Any]] = None
 ):
     """Context manager to instrument ML model operations."""
-    span = create_child_span(
-        request,
-        f"ml.{model_name}.{operation}",
-        {
-            "ml.model.name": model_name,
-            "ml.operation": operation,
-            "ml.input.size": len(str(input_data)) if input_data else 0,
-        }
-    )
+    attributes = {
+        "ml.model.name": model_name,
+        "ml.operation": operation,
+        # Element count, not a repr of the (possibly large) payload
+        "ml.input.size": len(input_data) if isinstance(input_data, (list, dict, tuple, bytes)) else 0,
+    }
+    
+    if input_data and logger.isEnabledFor(logging.DEBUG):
+        attributes["ml.input.repr_size"] = len(str(input_data))
+    
+    span = create_child_span(request, f"ml.{model_name}.{operation}", attributes)
     
     if not span:
         yield None
         return
     
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
     try:
         yield span
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "ml.duration": duration,
             "ml.success": True,
@@ -320,7 +387,7 @@ def instrument_model_operation(
         )
         
     except Exception as e:
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "ml.duration": duration,
             "ml.success": False,
@@ -366,12 +433,12 @@ def instrument_database_operation(
         yield None
         return
     
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
     try:
         yield span
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "db.duration": duration,
             "db.success": True,
@@ -379,7 +446,7 @@ def instrument_database_operation(
         span.set_status(Status(StatusCode.OK))
         
     except Exception as e:
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "db.duration": duration,
             "db.success": False,
@@ -414,12 +481,12 @@ def instrument_external_call(
         yield None
         return
     
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
     try:
         yield span
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "http.duration": duration,
             "http.success": True,
@@ -427,7 +494,7 @@ def instrument_external_call(
         span.set_status(Status(StatusCode.OK))
         
     except Exception as e:
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter_ns() - start_ns) / 1e6
         span.set_attributes({
             "http.duration": duration,
             "http.success": False,
@@ -459,9 +526,4 @@ def shutdown_tracing() -> None:
     provider = trace.get_tracer_provider()
     if hasattr(provider, "shutdown"):
         provider.shutdown()
-        logger.info("Distributed tracing shutdown completed")
-
-
-# Auto-initialize when module is imported
-if __name__ != "__main__":
-    initialize_tracing()
\ No newline at end of file
+        logger.info("Distributed tracing shutdown completed")
\ No newline at end of file
@@ -2,19 +2,94 @@
 Data Validators
 """
 from typing import Dict, Any, List, Optional
-import re
+import string
 from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+
+_DIGITS = frozenset(string.digits)
+_PROCEDURE_CHARS = frozenset(string.ascii_uppercase + string.digits)
+# str.translate table deleting C0/C1 control characters (U+0000-001F, U+007F-009F)
+_CTRL_TABLE = dict.fromkeys([*range(0x20), *range(0x7F, 0xA0)])
+
+_TREATMENT_RECORD_FIELDS = frozenset({"date", "procedure_code"})
+
+_VALID_MODELS = frozenset({
+    "bert_medical",
+    "gpt4_medical",
+    "xgboost_fraud",
+    "lstm_patterns",
+    "decision_pipeline"
+})
+
+
+def _valid_procedure_code(code: str) -> bool:
+    """Procedure code: 3+ ASCII uppercase letters or digits."""
+    return len(code) >= 3 and _PROCEDURE_CHARS.issuperset(code)
+
+
+def _valid_icd_code(code: str) -> bool:
+    """ICD code: letter, two digits, optional '.' and one or two digits (e.g. E11.9)."""
+    n = len(code)
+    return (
+        (n == 3 or (5 <= n <= 6 and code[3] == "."))
+        and "A" <= code[0] <= "Z"
+        and _DIGITS.issuperset(code[1:3])
+        and _DIGITS.issuperset(code[4:])
+    )
 
 
 def validate_case_data(data: Dict[str, Any]) -> Optional[List[str]]:
     """Validate case data and return list of errors if any."""
+    age = data.get("patient_age")
+    cost = data.get("cost_requested")
+    
+    return _collect_case_errors(
+        data,
+        invalid_age=age is not None and (not isinstance(age, int) or age < 0 or age > 150),
+        invalid_cost=cost is not None and (not isinstance(cost, (int, float)) or cost < 0),
+    )
+
+
+def validate_case_data_batch(cases: List[Dict[str, Any]]) -> List[Optional[List[str]]]:
+    """Validate many cases at once; same result as validate_case_data per case.
+    
+    Age and cost range checks run as NumPy array comparisons over the batch.
+    """
+    n = len(cases)
+    ages = [case.get("patient_age") for case in cases]
+    costs = [case.get("cost_requested") for case in cases]
+    
+    # Non-numeric values are flagged by type and compared as 0
+    age_numeric = np.fromiter((isinstance(a, int) for a in ages), dtype=bool, count=n)
+    age_values = np.fromiter((a if isinstance(a, int) else 0 for a in ages), dtype=np.float64, count=n)
+    age_present = np.fromiter((a is not None for a in ages), dtype=bool, count=n)
+    invalid_ages = age_present & (~age_numeric | (age_values < 0) | (age_values > 150))
+    
+    cost_numeric = np.fromiter((isinstance(c, (int, float)) for c in costs), dtype=bool, count=n)
+    cost_values = np.fromiter((c if isinstance(c, (int, float)) else 0 for c in costs), dtype=np.float64, count=n)
+    cost_present = np.fromiter((c is not None for c in costs), dtype=bool, count=n)
+    invalid_costs = cost_present & (~cost_numeric | (cost_values < 0))
+    
+    return [
+        _collect_case_errors(case, invalid_age=bool(bad_age), invalid_cost=bool(bad_cost))
+        for case, bad_age, bad_cost in zip(cases, invalid_ages, invalid_costs)
+    ]
+
+
+def _collect_case_errors(
+    data: Dict[str, Any],
+    invalid_age: bool,
+    invalid_cost: bool
+) -> Optional[List[str]]:
+    """Build the error list for one case given its precomputed age/cost checks."""
     errors = []
     
     # Validate patient age
-    age = data.get("patient_age")
-    if age is not None:
-        if not isinstance(age, int) or age < 0 or age > 150:
-            errors.append("Invalid patient age")
+    if invalid_age:
+        errors.append("Invalid patient age")
     
     # Validate gender
     gender = data.get("patient_gender")
@@ -23,19 +98,17 @@ def validate_case_data(data: Dict[str, Any]) -> Optional[List[str]]:
     
     # Validate procedure code format
     procedure_code = data.get("procedure_code", "")
-    if not re.match(r"^[A-Z0-9]{3,}$", procedure_code):
+    if not _valid_procedure_code(procedure_code):
         errors.append("Invalid procedure code format")
     
     # Validate diagnosis code (ICD format)
     diagnosis_code = data.get("diagnosis_code", "")
-    if not re.match(r"^[A-Z][0-9]{2}(\.[0-9]{1,2})?$", diagnosis_code):
+    if not _valid_icd_code(diagnosis_code):
         errors.append("Invalid diagnosis code format (ICD)")
     
     # Validate cost
-    cost = data.get("cost_requested")
-    if cost is not None:
-        if not isinstance(cost, (int, float)) or cost < 0:
-            errors.append("Invalid cost requested")
+    if invalid_cost:
+        errors.append("Invalid cost requested")
     
     # Validate urgency level
     urgency = data.get("urgency_level")
@@ -45,10 +118,10 @@ def validate_case_data(data: Dict[str, Any]) -> Optional[List[str]]:
     # Validate treatment history
     treatment_history = data.get("treatment_history", [])
     if treatment_history:
-        for i, record in enumerate(treatment_history[:5]):  # Check first 5
+        for i, record in enumerate(islice(treatment_history, 5)):  # Check first 5
             if not isinstance(record, dict):
                 errors.append(f"Treatment history record {i} must be a dictionary")
-            elif "date" not in record or "procedure_code" not in record:
+            elif not _TREATMENT_RECORD_FIELDS.issubset(record):
                 errors.append(f"Treatment history record {i} missing required fields")
     
     return errors if errors else None
@@ -67,27 +140,24 @@ def validate_chat_message(message: str) -> Optional[str]:
 
 def validate_model_name(model_name: str) -> bool:
     """Validate model name format."""
-    valid_models = [
-        "bert_medical",
-        "gpt4_medical",
-        "xgboost_fraud",
-        "lstm_patterns",
-        "decision_pipeline"
-    ]
-    return model_name in valid_models
+    return model_name in _VALID_MODELS
 
 
 def sanitize_input(text: str) -> str:
     """Sanitize text input."""
     # Remove control characters
-    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
-    # Normalize whitespace
-    text = ' '.join(text.split())
-    return text.strip()
+    text = text.translate(_CTRL_TABLE)
+    # Normalize whitespace; split() already drops leading/trailing runs
+    return ' '.join(text.split())
 
 
 def validate_date_format(date_str: str) -> bool:
     """Validate date format (ISO 8601)."""
+    # Every form fromisoformat accepts is 7+ chars starting with a 4-digit
+    # year; reject anything else without raising and catching ValueError
+    if len(date_str) < 7 or not date_str[:4].isdigit():
+        return False
+    
     try:
         datetime.fromisoformat(date_str)
         return True
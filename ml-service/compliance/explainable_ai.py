@@ -8,6 +8,7 @@ import os
 import logging
 import json
 import hashlib
+import weakref
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 import numpy as np
@@ -16,6 +17,11 @@ import shap
 import lime
 from lime.tabular import LimeTabularExplainer
 from sklearn.base import BaseEstimator
+from sklearn.ensemble import (
+    ExtraTreesClassifier, ExtraTreesRegressor, GradientBoostingClassifier,
+    GradientBoostingRegressor, IsolationForest, RandomForestClassifier, RandomForestRegressor
+)
+from sklearn.tree import BaseDecisionTree
 import asyncio
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -27,6 +33,14 @@ from sqlalchemy import create_engine, text
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Models shap.TreeExplainer handles natively (TreeSHAP, no model.predict calls)
+_TREE_MODEL_TYPES = (
+    BaseDecisionTree, RandomForestClassifier, RandomForestRegressor,
+    ExtraTreesClassifier, ExtraTreesRegressor, GradientBoostingClassifier,
+    GradientBoostingRegressor, IsolationForest
+)
+_TREE_MODEL_PACKAGES = ('xgboost', 'lightgbm', 'catboost')
+
 class ComplianceLevel(Enum):
     HIPAA = "hipaa"
     GDPR = "gdpr"
@@ -106,8 +120,9 @@ class ExplainableAI:
             }
         }
         
-        # Initialize explainers cache
-        self.explainers_cache = {}
+        # Explainers keyed by (method, id(model)); entries are evicted when
+        # the model is garbage collected so ids are never reused stale
+        self.explainers_cache: Dict[Tuple[ExplanationMethod, int], Any] = {}
     
     async def generate_explanation(self, prediction_id: str, model_type: str, 
                                  model: BaseEstimator, features: np.ndarray,
@@ -143,9 +158,12 @@ class ExplainableAI:
                 model_type, explanation, prediction
             )
             
+            # Serialize contributions once for both the audit hash and encrypted storage
+            serialized_explanation = json.dumps(explanation, sort_keys=True).encode()
+            
             # Create audit trail
             audit_trail = await self._create_audit_trail(
-                prediction_id, model_type, method, explanation
+                prediction_id, model_type, method, explanation, serialized_explanation
             )
             
             # Generate human-readable explanation
@@ -166,7 +184,7 @@ class ExplainableAI:
             )
             
             # Store explanation
-            await self._store_explanation(result)
+            await self._store_explanation(result, serialized_explanation)
             
             return result
             
@@ -177,17 +195,30 @@ class ExplainableAI:
     async def _get_explainer(self, model: BaseEstimator, features: np.ndarray,
                            feature_names: List[str], method: ExplanationMethod):
         """Get or create explainer for the model"""
-        cache_key = f"{method.value}_{hash(str(model))}"
+        if method not in (ExplanationMethod.SHAP, ExplanationMethod.LIME):
+            return model  # For feature importance methods
         
-        if cache_key in self.explainers_cache:
-            return self.explainers_cache[cache_key]
+        cache_key = (method, id(model))
+        explainer = self.explainers_cache.get(cache_key)
+        if explainer is not None:
+            return explainer
         
         if method == ExplanationMethod.SHAP:
             # Choose appropriate SHAP explainer based on model type
-            if hasattr(model, 'predict_proba'):
-                explainer = shap.Explainer(model)
+            if self._is_tree_model(model):
+                # Exact TreeSHAP in C++ from the tree structure; needs no background
+                explainer = shap.TreeExplainer(model, feature_perturbation='tree_path_dependent')
+            elif hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+                # Closed form from the coefficients and the background mean
+                background = shap.sample(features, 50, random_state=0)
+                explainer = shap.LinearExplainer(model, background)
             else:
-                explainer = shap.Explainer(model.predict, features[:100])  # Sample for performance
+                # Model-agnostic: every SHAP evaluation calls the model once per
+                # background row, so summarize it once here; the explainer (and its
+                # background) is then cached per model
+                background = shap.sample(features, 50, random_state=0)
+                predict = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
+                explainer = shap.Explainer(predict, background)
         
         elif method == ExplanationMethod.LIME:
             explainer = LimeTabularExplainer(
@@ -197,12 +228,22 @@ class ExplainableAI:
                 discretize_continuous=True
             )
         
-        else:
-            explainer = model  # For feature importance methods
+        try:
+            weakref.finalize(model, self.explainers_cache.pop, cache_key, None)
+        except TypeError:
+            # Not weak-referenceable: its id could be reused, so don't cache
+            return explainer
         
         self.explainers_cache[cache_key] = explainer
         return explainer
     
+    def _is_tree_model(self, model: BaseEstimator) -> bool:
+        """Check whether shap.TreeExplainer supports the model"""
+        return (
+            isinstance(model, _TREE_MODEL_TYPES) or
+            type(model).__module__.startswith(_TREE_MODEL_PACKAGES)
+        )
+    
     async def _generate_shap_explanation(self, explainer, features: np.ndarray,
                                        feature_names: List[str], prediction: Any) -> Dict[str, float]:
         """Generate SHAP-based explanation"""
@@ -217,17 +258,22 @@ class ExplainableAI:
                 contributions = shap_values[0] if isinstance(shap_values, list) else shap_values
             
             # Create feature contribution dictionary
-            explanation = {}
-            for i, feature_name in enumerate(feature_names):
-                if i < len(contributions):
-                    explanation[feature_name] = float(contributions[i])
-            
-            return explanation
+            return self._contributions_by_feature(feature_names, contributions)
             
         except Exception as e:
             logger.error(f"Error generating SHAP explanation: {e}")
             return {}
     
+    def _contributions_by_feature(self, feature_names: List[str], values: Any) -> Dict[str, float]:
+        """Map feature names to per-feature values, truncated to the shorter of the two"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 1:
+            raise ValueError(f"Expected one value per feature, got shape {values.shape}")
+        
+        # tolist() converts the whole row to Python floats in one C loop
+        n = min(len(feature_names), values.shape[0])
+        return dict(zip(feature_names[:n], values[:n].tolist()))
+    
     async def _generate_lime_explanation(self, explainer, features: np.ndarray,
                                        feature_names: List[str], prediction: Any) -> Dict[str, float]:
         """Generate LIME-based explanation"""
@@ -265,12 +311,7 @@ class ExplainableAI:
             else:
                 return {}
             
-            explanation = {}
-            for i, feature_name in enumerate(feature_names):
-                if i < len(importances):
-                    explanation[feature_name] = float(importances[i])
-            
-            return explanation
+            return self._contributions_by_feature(feature_names, importances)
             
         except Exception as e:
             logger.error(f"Error generating feature importance explanation: {e}")
@@ -296,12 +337,7 @@ class ExplainableAI:
                 model, sample_features, sample_target, n_repeats=5, random_state=42
             )
             
-            explanation = {}
-            for i, feature_name in enumerate(feature_names):
-                if i < len(perm_importance.importances_mean):
-                    explanation[feature_name] = float(perm_importance.importances_mean[i])
-            
-            return explanation
+            return self._contributions_by_feature(feature_names, perm_importance.importances_mean)
             
         except Exception as e:
             logger.error(f"Error generating permutation explanation: {e}")
@@ -339,8 +375,12 @@ class ExplainableAI:
         return notes
     
     async def _create_audit_trail(self, prediction_id: str, model_type: str,
-                                method: ExplanationMethod, explanation: Dict[str, float]) -> Dict[str, Any]:
+                                method: ExplanationMethod, explanation: Dict[str, float],
+                                serialized_explanation: Optional[bytes] = None) -> Dict[str, Any]:
         """Create comprehensive audit trail"""
+        if serialized_explanation is None:
+            serialized_explanation = json.dumps(explanation, sort_keys=True).encode()
+        
         return {
             'prediction_id': prediction_id,
             'model_type': model_type,
@@ -348,7 +388,7 @@ class ExplainableAI:
             'explanation_generated_at': datetime.now().isoformat(),
             'feature_count': len(explanation),
             'top_features': sorted(explanation.items(), key=lambda x: abs(x[1]), reverse=True)[:5],
-            'explanation_hash': hashlib.sha256(json.dumps(explanation, sort_keys=True).encode()).hexdigest(),
+            'explanation_hash': hashlib.sha256(serialized_explanation).hexdigest(),
             'compliance_checks': ['data_anonymization', 'audit_logging', 'explanation_generation'],
             'system_version': '2.1.0',
             'regulatory_framework': ['HIPAA', 'LGPD', 'ANS_BRAZIL']
@@ -439,13 +479,15 @@ class ExplainableAI:
         confidence = (dominance_score * 0.6 + coverage_score * 0.4)
         return min(1.0, max(0.0, confidence))
     
-    async def _store_explanation(self, explanation: ExplanationResult):
+    async def _store_explanation(self, explanation: ExplanationResult,
+                                 serialized_explanation: Optional[bytes] = None):
         """Store explanation with encryption for compliance"""
         try:
+            if serialized_explanation is None:
+                serialized_explanation = json.dumps(explanation.feature_contributions, sort_keys=True).encode()
+            
             # Encrypt sensitive data
-            encrypted_explanation = self.cipher_suite.encrypt(
-                json.dumps(explanation.feature_contributions).encode()
-            )
+            encrypted_explanation = self.cipher_suite.encrypt(serialized_explanation)
             
             # Store in database
             query = """